@@ -0,0 +1,496 @@
+"""Local HTTP/JSON service over db_manager.
+
+GET responses carry an ETag built from db_manager.get_data_version(). A
+request with a matching If-None-Match gets 304 Not Modified without touching
+the tables, and identical requests between writes are answered from an
+in-memory response cache. Large bodies are gzip-compressed for clients that
+accept it.
+
+Run from the project root:
+    python -m api.server [--host 127.0.0.1] [--port 8000] [--db inventory.db]
+
+Endpoints (JSON in, JSON out):
+    GET    /categories?after=<id>&limit=<n>       one page, ordered by id
+    GET    /categories/hierarchy                  the whole nested tree
+    GET    /categories/<id>                       category with path and stats
+    GET    /categories/<id>/children              direct subcategories
+    GET    /categories/<id>/descendants           whole subtree, parents first
+    GET    /categories/<id>/ancestors             root first
+    GET    /categories/<id>/products?subtree=1    its products (or its subtree's)
+    POST   /categories                            {"name", "parent_id"}
+    PATCH  /categories/<id>                       {"name"?, "parent_id"?}
+    DELETE /categories/<id>
+    GET    /products?after=<token>&limit=<n>&order_by=<col>&desc=1
+    GET    /products/query?category=<id>&min_price=<p>&max_price=<p>&q=<text>
+           &order_by=<col>&desc=1&limit=<n>&per_category=<n>&facets=1
+    POST   /products                              {"name", "price", "category_id"}
+    PUT    /products/<id>                         {"name", "price", "category_id"}
+    DELETE /products/<id>
+    GET    /search/products?q=<text>&category=<id>&limit=<n>
+    GET    /search/categories?q=<text>&limit=<n>
+    GET    /changes?since=<seq>&limit=<n>          change log entries after seq
+
+Paginated responses include "next": pass it back as "after" for the next
+page; it is null on the last page.
+
+Each open connection occupies one of --workers threads (default WORKERS)
+for as long as it stays open, including idle keep-alive time of up to
+KEEP_ALIVE_TIMEOUT seconds between requests. A browser keeps around six
+connections per client, so size --workers well above the expected number
+of concurrent keep-alive connections; beyond that, new requests queue.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database.db_manager as db
+from utils.validator import is_not_empty, is_valid_price
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+RESPONSE_CACHE_SIZE = 256
+WORKERS = 32
+KEEP_ALIVE_TIMEOUT = 5     # seconds an idle keep-alive connection may hold a worker
+
+# Distinguishes ETags across restarts, since data versions start over
+_BOOT_ID = base64.urlsafe_b64encode(os.urandom(6)).decode()
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# REQUEST HELPERS
+
+
+def _int_arg(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer.")
+
+
+def _float_arg(query, name):
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return float(values[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a number.")
+
+
+def _limit(query):
+    return max(1, min(_int_arg(query, "limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def _flag(query, name):
+    return query.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+
+def _encode_key(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+# Types of the fields of a get_products_page key, per sort column
+_KEY_TYPES = {
+    "id": (int,),
+    "name": (str, int),
+    "price": ((int, float), int),
+    "category": (str, int),
+}
+
+
+def _decode_key(token, order_by):
+    try:
+        key = tuple(json.loads(base64.urlsafe_b64decode(token.encode())))
+    except (ValueError, TypeError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid 'after' token.")
+    types = _KEY_TYPES[order_by]
+    if len(key) != len(types) or any(
+            isinstance(value, bool) or not isinstance(value, kind) for value, kind in zip(key, types)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid 'after' token.")
+    return key
+
+
+def _result(result, created=False):
+    """Map a db_manager status dict onto an HTTP status."""
+    if result.get("status") == "success":
+        return (HTTPStatus.CREATED if created else HTTPStatus.OK), result
+    if result.get("updated") is False or result.get("deleted") is False:
+        return HTTPStatus.NOT_FOUND, result
+    return HTTPStatus.BAD_REQUEST, result
+
+
+def _require(body, *fields):
+    missing = [f for f in fields if f not in body]
+    if missing:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing field(s): {', '.join(missing)}.")
+    if "name" in fields and not (isinstance(body["name"], str) and is_not_empty(body["name"])):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Name must not be empty.")
+    if "price" in fields and (isinstance(body["price"], bool) or not is_valid_price(body["price"])):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Price must be a non-negative number.")
+
+
+def _optional_id(body, field):
+    """The body's field (e.g. "parent_id"), which must be an integer id or null."""
+    value = body.get(field)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{field} must be an integer or null.")
+    return value
+
+# HANDLERS
+# Each takes (path match, query dict, JSON body) and returns (status, payload).
+
+
+def list_categories(match, query, body):
+    after = _int_arg(query, "after", 0)
+    limit = _limit(query)
+    # get_all_categories() is cached, so a page is a filter over memory
+    rows = sorted((c for c in db.get_all_categories() if c["id"] > after), key=lambda c: c["id"])
+    page = rows[:limit]
+    next_after = page[-1]["id"] if len(rows) > limit else None
+    return HTTPStatus.OK, {"categories": page, "next": next_after}
+
+
+def category_hierarchy(match, query, body):
+    return HTTPStatus.OK, {"categories": db.get_category_hierarchy()}
+
+
+def get_category(match, query, body):
+    category_id = int(match["id"])
+    category = db.get_category_map().get(category_id)
+    if category is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, "Category not found.")
+    return HTTPStatus.OK, {
+        **category,
+        "path": db.get_category_path(category_id),
+        "stats": db.get_category_stats(category_id),
+    }
+
+
+def category_children(match, query, body):
+    return HTTPStatus.OK, {"categories": db.get_child_categories(int(match["id"]))}
+
+
+def category_descendants(match, query, body):
+    return HTTPStatus.OK, {"categories": db.get_descendants(int(match["id"]), _int_arg(query, "max_depth"))}
+
+
+def category_ancestors(match, query, body):
+    return HTTPStatus.OK, {"categories": db.get_ancestors(int(match["id"]))}
+
+
+def category_products(match, query, body):
+    category_id = int(match["id"])
+    if _flag(query, "subtree"):
+        return HTTPStatus.OK, {"products": db.get_products_in_subtree(category_id)}
+    return HTTPStatus.OK, {"products": db.get_products_by_category(category_id)}
+
+
+def create_category(match, query, body):
+    _require(body, "name")
+    return _result(db.add_category(body["name"].strip(), _optional_id(body, "parent_id")), created=True)
+
+
+def update_category(match, query, body):
+    name = body.get("name")
+    if name is not None:
+        _require(body, "name")
+        name = name.strip()
+    return _result(db.update_category(int(match["id"]), name, _optional_id(body, "parent_id")))
+
+
+def delete_category(match, query, body):
+    return _result(db.delete_category(int(match["id"])))
+
+
+def list_products(match, query, body):
+    order_by = query.get("order_by", ["id"])[0]
+    if order_by not in db.PRODUCT_SORT_COLUMNS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Unsupported sort column: {order_by}")
+    after = query.get("after", [None])[0]
+    page = db.get_products_page(
+        after_key=_decode_key(after, order_by) if after else None,
+        limit=_limit(query),
+        order_by=order_by,
+        descending=_flag(query, "desc"),
+    )
+    return HTTPStatus.OK, {"products": page["products"], "next": _encode_key(page["next_key"])}
+
+
+def query_products(match, query, body):
+    order_by = query.get("order_by", ["name"])[0]
+    if order_by not in db.QUERY_SORT_COLUMNS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Unsupported sort column: {order_by}")
+    result = db.query_products(
+        category_subtree=_int_arg(query, "category"),
+        min_price=_float_arg(query, "min_price"),
+        max_price=_float_arg(query, "max_price"),
+        name=query.get("q", [""])[0],
+        order_by=order_by,
+        descending=_flag(query, "desc"),
+        limit=_limit(query),
+        per_category=_int_arg(query, "per_category"),
+        facets=_flag(query, "facets"),
+    )
+    return HTTPStatus.OK, result
+
+
+def create_product(match, query, body):
+    _require(body, "name", "price")
+    return _result(db.add_product(body["name"].strip(), float(body["price"]), _optional_id(body, "category_id")), created=True)
+
+
+def update_product(match, query, body):
+    _require(body, "name", "price")
+    return _result(db.update_product(int(match["id"]), body["name"].strip(), float(body["price"]), _optional_id(body, "category_id")))
+
+
+def delete_product(match, query, body):
+    return _result(db.delete_product(int(match["id"])))
+
+
+def search_products(match, query, body):
+    text = query.get("q", [""])[0]
+    products = db.search_products(text, limit=_limit(query), category_subtree=_int_arg(query, "category"))
+    return HTTPStatus.OK, {"products": products}
+
+
+def search_categories(match, query, body):
+    return HTTPStatus.OK, {"categories": db.search_categories(query.get("q", [""])[0], limit=_limit(query))}
+
+
+def changes_since(match, query, body):
+    return HTTPStatus.OK, db.get_changes_since(_int_arg(query, "since", 0), limit=_limit(query))
+
+
+ROUTES = [
+    ("GET", r"/categories", list_categories),
+    ("GET", r"/categories/hierarchy", category_hierarchy),
+    ("GET", r"/categories/(?P<id>\d+)", get_category),
+    ("GET", r"/categories/(?P<id>\d+)/children", category_children),
+    ("GET", r"/categories/(?P<id>\d+)/descendants", category_descendants),
+    ("GET", r"/categories/(?P<id>\d+)/ancestors", category_ancestors),
+    ("GET", r"/categories/(?P<id>\d+)/products", category_products),
+    ("POST", r"/categories", create_category),
+    ("PATCH", r"/categories/(?P<id>\d+)", update_category),
+    ("DELETE", r"/categories/(?P<id>\d+)", delete_category),
+    ("GET", r"/products", list_products),
+    ("GET", r"/products/query", query_products),
+    ("POST", r"/products", create_product),
+    ("PUT", r"/products/(?P<id>\d+)", update_product),
+    ("DELETE", r"/products/(?P<id>\d+)", delete_product),
+    ("GET", r"/search/products", search_products),
+    ("GET", r"/search/categories", search_categories),
+    ("GET", r"/changes", changes_since),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?\Z"), handler) for method, pattern, handler in ROUTES]
+
+
+def _route(method, path):
+    allowed = False
+    for route_method, pattern, handler in _ROUTES:
+        match = pattern.match(path)
+        if match:
+            if route_method == method:
+                return handler, match
+            allowed = True
+    if allowed:
+        raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed.")
+    raise ApiError(HTTPStatus.NOT_FOUND, "Not found.")
+
+# RESPONSE CACHE
+
+
+class ResponseCache:
+    """Serialized GET bodies keyed by URL, valid for one data version."""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url, version):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(url)
+            return entry[1]
+
+    def put(self, url, version, response):
+        with self._lock:
+            self._entries[url] = (version, response)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class _Response:
+    __slots__ = ("status", "body", "gzipped")
+
+    def __init__(self, status, payload):
+        self.status = status
+        self.body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.gzipped = None
+
+    def gzip_body(self):
+        # Compressed lazily, once, then reused from the response cache
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=5)
+        return self.gzipped
+
+# SERVER
+
+
+class CatalogRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CatalogAPI/1.0"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        try:
+            url = urlsplit(self.path)
+            handler, match = _route(method, url.path)
+            query = parse_qs(url.query)
+            if method == "GET":
+                self._get(handler, match, query)
+            else:
+                status, payload = handler(match, query, self._read_json())
+                self._send(_Response(status, payload))
+        except ApiError as e:
+            self._send(_Response(e.status, {"status": "error", "message": e.message}))
+        except Exception as e:
+            self.log_error("Unhandled error: %r", e)
+            self._send(_Response(HTTPStatus.INTERNAL_SERVER_ERROR, {"status": "error", "message": "Internal error."}))
+
+    def _get(self, handler, match, query):
+        version = db.get_data_version()
+        etag = f'"{_BOOT_ID}-{version}"'
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        response = self.server.responses.get(self.path, version)
+        if response is None:
+            status, payload = handler(match, query, None)
+            response = _Response(status, payload)
+            if status == HTTPStatus.OK:
+                self.server.responses.put(self.path, version, response)
+        self._send(response, etag if response.status == HTTPStatus.OK else None)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be JSON.")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+        return body
+
+    def _send(self, response, etag=None):
+        body = response.body
+        use_gzip = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = response.gzip_body()
+        self.send_response(response.status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CatalogServer(HTTPServer):
+    """HTTPServer that handles connections on a fixed pool of threads.
+
+    Reusing threads keeps each one's pooled SQLite connection warm instead
+    of opening a new connection for every request.
+    """
+
+    def __init__(self, address, handler=CatalogRequestHandler, workers=WORKERS):
+        super().__init__(address, handler)
+        self.responses = ResponseCache()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the catalog as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    db.DB_NAME = args.db
+    db.initialize_database()
+    server = CatalogServer((args.host, args.port), workers=args.workers)
+    print(f"Serving {args.db} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
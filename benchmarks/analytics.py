@@ -0,0 +1,90 @@
+"""Price analytics through data.analytics (NumPy) against the dict path:
+get_all_products() and plain Python loops computing the same figures.
+
+Run from the project root:
+    python -m benchmarks.analytics [--products 1000000] [--db existing.db]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import database.db_manager as db
+from benchmarks import catalog
+from data import analytics
+
+PERCENTILES = (50, 90, 99)
+BINS = 10
+
+
+def dict_report():
+    """Direct and subtree count/sum/min/max, per-category percentiles and a
+    histogram the way a report was written before data.analytics."""
+    products = db.get_all_products()
+    parents = {c["id"]: c["parent_id"] for c in db.get_all_categories()}
+    by_category = {}
+    for p in products:
+        by_category.setdefault(p["category_id"], []).append(p["price"])
+
+    direct = {}
+    for category_id, prices in by_category.items():
+        if category_id is not None:
+            direct[category_id] = (len(prices), sum(prices), min(prices), max(prices))
+    subtree = {}
+    for category_id, (count, total, low, high) in direct.items():
+        node, seen = category_id, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            c, t, lo, hi = subtree.get(node, (0, 0.0, float("inf"), float("-inf")))
+            subtree[node] = (c + count, t + total, min(lo, low), max(hi, high))
+            node = parents.get(node)
+    percentiles = {
+        category_id: statistics.quantiles(prices, n=100, method="inclusive") if len(prices) > 1 else prices * 99
+        for category_id, prices in by_category.items()
+    }
+    prices = [p["price"] for p in products]
+    low, high = min(prices), max(prices)
+    width = (high - low) / BINS or 1
+    histogram = [0] * BINS
+    for price in prices:
+        histogram[min(int((price - low) / width), BINS - 1)] += 1
+    return direct, subtree, percentiles, histogram
+
+
+def _time(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--db", help="measure an existing database instead of generating one")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            db.DB_NAME = args.db
+            db.initialize_database()
+        else:
+            db.DB_NAME = os.path.join(tmp, "bench.db")
+            catalog.generate("balanced", args.categories, args.products)
+
+        dict_seconds = _time(dict_report)
+        load_seconds = _time(analytics.load_catalog)
+        compute_seconds = _time(lambda: analytics.price_report(PERCENTILES, BINS))
+        db.close_database()
+
+    cold = load_seconds + compute_seconds
+    print(f"{'path':<28}{'seconds':>10}{'speedup':>10}")
+    print(f"{'dicts + Python loops':<28}{dict_seconds:>10.2f}{1:>9.1f}x")
+    print(f"{'numpy, reading the db':<28}{cold:>10.2f}{dict_seconds / cold:>9.1f}x")
+    print(f"{'  of which loading arrays':<28}{load_seconds:>10.2f}")
+    print(f"{'numpy, arrays already read':<28}{compute_seconds:>10.2f}{dict_seconds / compute_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
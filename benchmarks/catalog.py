@@ -0,0 +1,106 @@
+"""Deterministic synthetic catalogs for benchmarking.
+
+The same shape, sizes and seed always produce the same database, so timings
+from different commits are comparable.
+
+Shapes:
+    deep      long parent chains (each category usually nests under the last)
+    wide      a handful of roots with every other category directly under them
+    balanced  a complete tree with a fixed fan-out
+
+Run from the project root to write a catalog to a file:
+    python -m benchmarks.catalog bench.db --shape balanced --categories 1000 --products 100000
+"""
+import argparse
+import itertools
+import random
+import time
+
+import database.db_manager as db
+
+SHAPES = ("deep", "wide", "balanced")
+BALANCED_FANOUT = 8
+WIDE_ROOTS = 4
+DEEP_BRANCH_CHANCE = 0.05   # chance a deep-tree node starts a new branch instead of nesting
+INSERT_CHUNK = 50000
+
+_ADJECTIVES = ("Compact", "Deluxe", "Eco", "Classic", "Smart", "Portable", "Premium", "Mini",
+               "Ultra", "Wireless", "Vintage", "Rugged", "Silent", "Turbo", "Organic", "Digital")
+_NOUNS = ("Phone", "Kettle", "Lamp", "Speaker", "Backpack", "Blender", "Camera", "Charger",
+          "Desk", "Headset", "Jacket", "Monitor", "Router", "Sneaker", "Toaster", "Watch")
+
+
+def category_parents(shape, count, seed=0):
+    """Return parent indexes for categories 0..count-1 (None for roots).
+    Parents always come before their children."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape: {shape}")
+    rnd = random.Random(seed)
+    parents = []
+    for i in range(count):
+        if shape == "balanced":
+            parents.append((i - 1) // BALANCED_FANOUT if i else None)
+        elif shape == "wide":
+            parents.append(None if i < WIDE_ROOTS else rnd.randrange(WIDE_ROOTS))
+        elif i == 0:
+            parents.append(None)
+        elif rnd.random() < DEEP_BRANCH_CHANCE:
+            parents.append(rnd.randrange(i))
+        else:
+            parents.append(i - 1)
+    return parents
+
+
+def iter_products(count, category_count, seed=0):
+    """Yield (name, price, category index) tuples for count products."""
+    rnd = random.Random(seed + 1)
+    for i in range(count):
+        name = f"{rnd.choice(_ADJECTIVES)} {rnd.choice(_NOUNS)} {i}"
+        price = round(rnd.lognormvariate(3.5, 1.0), 2)
+        yield name, price, rnd.randrange(category_count)
+
+
+def generate(shape="balanced", categories=1000, products=10000, seed=0):
+    """Fill the (empty) database at db.DB_NAME with a synthetic catalog.
+    Category i gets id i + 1. Returns the seconds spent loading."""
+    db.initialize_database()
+    conn = db._connect()
+    start = time.perf_counter()
+    parents = category_parents(shape, categories, seed)
+    with conn:
+        conn.executemany(
+            "INSERT INTO categories (id, name, parent_id) VALUES (?, ?, ?)",
+            ((i + 1, f"Category {i}", None if p is None else p + 1) for i, p in enumerate(parents)),
+        )
+    rows = iter_products(products, categories, seed)
+    while True:
+        chunk = [(name, price, c + 1) for name, price, c in itertools.islice(rows, INSERT_CHUNK)]
+        if not chunk:
+            break
+        with conn:
+            conn.executemany("INSERT INTO products (name, price, category_id) VALUES (?, ?, ?)", chunk)
+    conn.execute("PRAGMA optimize")
+    db._changed()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic catalog to a new database file.")
+    parser.add_argument("path")
+    parser.add_argument("--shape", choices=SHAPES, default="balanced")
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db.DB_NAME = args.path
+    db.initialize_database()
+    if db.get_all_categories():
+        parser.error(f"{args.path} already contains data")
+    elapsed = generate(args.shape, args.categories, args.products, args.seed)
+    print(f"Generated {args.categories} categories and {args.products} products in {elapsed:.1f}s.")
+    db.close_database()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Per-call latency of db_manager with the pooled connection vs. connect-per-call.
+
+Run from the project root:
+    python -m benchmarks.connection_latency [--calls 2000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import database.db_manager as db
+
+
+def _legacy_get_parent_category(category_id):
+    # The pre-pool pattern: open, query, close on every call.
+    conn = sqlite3.connect(db.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT c2.id, c2.name, c2.parent_id FROM categories c1 LEFT JOIN categories c2 ON c1.parent_id = c2.id WHERE c1.id = ?", (category_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def _legacy_add_product(name, price, category_id):
+    conn = sqlite3.connect(db.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO products (name, price, category_id) VALUES (?, ?, ?)", (name, price, category_id))
+    conn.commit()
+    conn.close()
+
+
+def _time_per_call(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        db.initialize_database()
+        root = db.add_category("Root")["id"]
+        leaf = db.add_category("Leaf", root)["id"]
+
+        scenarios = [
+            ("get_parent_category", lambda i: _legacy_get_parent_category(leaf), lambda i: db.get_parent_category(leaf)),
+            ("add_product", lambda i: _legacy_add_product(f"p{i}", 1.0, leaf), lambda i: db.add_product(f"p{i}", 1.0, leaf)),
+        ]
+        print(f"{'operation':<22}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+        for name, before, after in scenarios:
+            t_before = _time_per_call(before, args.calls)
+            t_after = _time_per_call(after, args.calls)
+            print(f"{name:<22}{t_before:>14.1f}{t_after:>14.1f}{t_before / t_after:>9.1f}x")
+        db.close_database()
+
+
+if __name__ == "__main__":
+    main()
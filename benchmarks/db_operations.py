@@ -0,0 +1,350 @@
+"""Time every public db_manager operation against a synthetic catalog.
+
+Results are written as JSON so runs from different commits can be compared;
+pass --baseline with an earlier result file to print the ratio per scenario.
+
+Run from the project root:
+    python -m benchmarks.db_operations --shape balanced --products 100000 -o after.json
+    python -m benchmarks.db_operations --products 100000 --baseline before.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import database.db_manager as db
+from benchmarks import catalog
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def time_scenario(fn, repeat, setup=None):
+    """Call fn() repeat times and return summary statistics in milliseconds.
+    setup(), if given, runs untimed before every call."""
+    samples = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": _percentile(samples, 0.95),
+        "max_ms": samples[-1],
+    }
+
+
+def _exhaust(iterator):
+    for _ in iterator:
+        pass
+
+
+def _gui_hierarchy_roots(i):
+    # What CategoryHierarchyTab loads on refresh: the root level only
+    return db.get_child_categories(None)
+
+
+def _gui_expand_node(category_id):
+    # What CategoryHierarchyTab loads when a node is opened
+    return db.get_products_by_category(category_id), db.get_child_categories(category_id)
+
+
+def _gui_full_tree(i):
+    # The eager tree build the hierarchy tab did before it loaded lazily:
+    # every category plus every product grouped under its category
+    by_category = {}
+    for p in db.get_all_products():
+        by_category.setdefault(p["category_id"], []).append(p)
+    return db.get_category_hierarchy(), by_category
+
+
+def build_scenarios(shape, categories, products, seed=0):
+    """Return [(name, fn(i), repeat kind, setup)] over a catalog generated with
+    the given sizes. "light" scenarios run many times, "heavy" ones (whole-table
+    reads and rebuilds) only a few."""
+    rnd = random.Random(seed + 2)
+    parents = catalog.category_parents(shape, categories, seed)
+    children = set(p for p in parents if p is not None)
+    leaves = [i + 1 for i in range(categories) if i not in children] or [1]
+    roots = [i + 1 for i, p in enumerate(parents) if p is None]
+    sample_categories = [rnd.randrange(categories) + 1 for _ in range(256)]
+    sample_leaves = [rnd.choice(leaves) for _ in range(256)]
+    sample_products = [rnd.randrange(products) + 1 for _ in range(256)] if products else [1]
+    deepest = max(range(categories), key=lambda i: _depth(parents, i)) + 1
+    names = itertools.count()
+    created_categories = []
+    created_products = []
+
+    def pick(values, i):
+        return values[i % len(values)]
+
+    def add_category(i):
+        result = db.add_category(f"bench category {next(names)}", pick(sample_categories, i))
+        created_categories.append(result["id"])
+
+    def delete_category(i):
+        db.delete_category(created_categories.pop())
+
+    def add_product(i):
+        result = db.add_product(f"bench product {next(names)}", 9.99, pick(sample_leaves, i))
+        created_products.append(result["product_id"])
+
+    def delete_product(i):
+        db.delete_product(created_products.pop())
+
+    def move_leaf(i):
+        # Move a leaf under another category and back, exercising both the
+        # cycle check and the closure/rollup triggers.
+        leaf = pick(sample_leaves, i)
+        original = parents[leaf - 1]
+        db.update_category(leaf, new_parent_id=pick(roots, i))
+        if original is not None:
+            db.update_category(leaf, new_parent_id=original + 1)
+
+    def cycle_rejected(i):
+        result = db.update_category(roots[0], new_parent_id=deepest)
+        assert result["status"] == "error" or deepest == roots[0]
+
+    def move_subtree(i):
+        # The same round trip as move_leaf, through the set-based move
+        leaf = pick(sample_leaves, i)
+        original = parents[leaf - 1]
+        db.move_subtree(leaf, pick(roots, i))
+        db.move_subtree(leaf, original + 1 if original is not None else None)
+
+    def edit_category(i):
+        leaf = pick(sample_leaves, i)
+        original = parents[leaf - 1]
+        db.edit_category(leaf, f"bench category {next(names)}", pick(roots, i))
+        db.edit_category(leaf, f"Category {leaf - 1}", original + 1 if original is not None else None)
+
+    doomed = []
+
+    def make_subtree():
+        # A fresh root with two children and a few products under each, so
+        # the timed delete or merge has the same amount of work every run
+        root = db.add_category(f"bench category {next(names)}")["id"]
+        for child in (db.add_category(f"bench category {next(names)}", root)["id"] for _ in range(2)):
+            for _ in range(5):
+                db.add_product(f"bench product {next(names)}", 9.99, child)
+        doomed.append(root)
+
+    def merge_into_leaf(i):
+        db.merge_categories(doomed.pop(), pick(sample_leaves, i))
+
+    def rename_category(i):
+        category_id = pick(sample_categories, i)
+        db.update_category(category_id, new_name=f"Category {category_id - 1}")
+
+    def update_product(i):
+        product_id = pick(sample_products, i)
+        db.update_product(product_id, f"Updated product {product_id}", 10.0 + i % 50, pick(sample_leaves, i))
+
+    bulk_rows = [{"name": f"bulk {n}", "price": 1.5, "category_id": pick(sample_leaves, n)} for n in range(1000)]
+    bulk_categories = itertools.count()
+
+    # The sync writers, in the order data.sync applies a snapshot
+    synced_categories = []
+    synced_products = []
+    fresh_ids = itertools.count(products + 1_000_000)
+
+    def leaf_name(n):
+        return f"Category {pick(sample_leaves, n) - 1}"
+
+    def insert_missing_categories(i):
+        batch = [f"bench category {next(names)}" for _ in range(100)]
+        db.insert_missing_categories(batch)
+        synced_categories.append(batch)
+
+    def set_category_parents(i):
+        parent = f"Category {pick(roots, i) - 1}"
+        db.set_category_parents([(name, parent) for name in synced_categories[-1]])
+
+    def upsert_inserts(i):
+        batch = [next(fresh_ids) for _ in range(1000)]
+        db.upsert_products([(product_id, f"bench product {next(names)}", 4.5, leaf_name(n))
+                            for n, product_id in enumerate(batch)])
+        synced_products.append(batch)
+
+    update_rows = [(product_id, f"Product {product_id}", 5.5 + product_id % 7, leaf_name(n))
+                   for n, product_id in enumerate(range(1, min(products, 1000) + 1))]
+
+    def cold():
+        db._changed()
+
+    return [
+        ("initialize_database (current schema)", lambda i: db.initialize_database(), "light", None),
+        ("get_data_version", lambda i: db.get_data_version(), "light", None),
+        ("add_category", add_category, "light", None),
+        ("delete_category", delete_category, "light", None),
+        ("get_all_categories (cold)", lambda i: db.get_all_categories(), "heavy", cold),
+        ("get_all_categories (cached)", lambda i: db.get_all_categories(), "light", None),
+        ("get_category_map (cached)", lambda i: db.get_category_map(), "light", None),
+        ("get_category_id_map (cached)", lambda i: db.get_category_id_map(), "light", None),
+        ("get_category_index (cold)", lambda i: db.get_category_index(), "heavy", cold),
+        ("get_category_index (cached)", lambda i: db.get_category_index(), "light", None),
+        ("get_category_hierarchy (cold)", lambda i: db.get_category_hierarchy(), "heavy", cold),
+        ("get_category_hierarchy (cached)", lambda i: db.get_category_hierarchy(), "light", None),
+        ("update_category (rename)", rename_category, "light", None),
+        ("update_category (move leaf and back)", move_leaf, "light", None),
+        ("update_category (cycle rejected)", cycle_rejected, "light", None),
+        ("move_subtree (leaf and back)", move_subtree, "light", None),
+        ("edit_category (rename and move, and back)", edit_category, "light", None),
+        ("delete_subtree (3 categories, 10 products)", lambda i: db.delete_subtree(doomed.pop()), "light",
+         make_subtree),
+        ("merge_categories (root with 2 children)", merge_into_leaf, "light", make_subtree),
+        ("get_subcategories", lambda i: db.get_subcategories(pick(sample_categories, i)), "light", None),
+        ("get_child_categories", lambda i: db.get_child_categories(pick(sample_categories, i)), "light", None),
+        ("get_parent_category", lambda i: db.get_parent_category(pick(sample_categories, i)), "light", None),
+        ("is_descendant", lambda i: db.is_descendant(deepest, roots[0]), "light", None),
+        ("get_subtree_ids (root)", lambda i: db.get_subtree_ids(pick(roots, i)), "heavy", None),
+        ("get_descendants (root)", lambda i: db.get_descendants(pick(roots, i)), "heavy", None),
+        ("get_ancestors (deepest)", lambda i: db.get_ancestors(deepest), "light", None),
+        ("get_category_path (deepest)", lambda i: db.get_category_path(deepest), "light", None),
+        ("get_category_stats", lambda i: db.get_category_stats(pick(sample_categories, i)), "light", None),
+        ("rebuild_category_closure", lambda i: db.rebuild_category_closure(), "heavy", None),
+        ("add_product", add_product, "light", None),
+        ("update_product", update_product, "light", None),
+        ("delete_product", delete_product, "light", None),
+        ("get_all_products", lambda i: db.get_all_products(), "heavy", None),
+        ("get_all_products (include_path)", lambda i: db.get_all_products(include_path=True), "heavy", None),
+        ("get_product", lambda i: db.get_product(pick(sample_products, i)), "light", None),
+        ("get_products_by_category", lambda i: db.get_products_by_category(pick(sample_leaves, i)), "light", None),
+        ("get_products_in_subtree (root)", lambda i: db.get_products_in_subtree(pick(roots, i)), "heavy", None),
+        ("get_products_page (first, by name)", lambda i: db.get_products_page(order_by="name"), "light", None),
+        ("get_products_page (deep, by price)",
+         lambda i: db.get_products_page(after_key=(50.0, products // 2), order_by="price"), "light", None),
+        ("query_products (subtree, price range)",
+         lambda i: db.query_products(category_subtree=pick(roots, i), min_price=10, max_price=60, order_by="price"),
+         "light", None),
+        ("query_products (per_category=5, facets)",
+         lambda i: db.query_products(pick(roots, i), order_by="price", limit=1000, per_category=5, facets=True),
+         "light", None),
+        ("query_products (name prefix)", lambda i: db.query_products(name=pick(catalog._NOUNS, i)[:3]), "light", None),
+        ("search_products", lambda i: db.search_products(pick(catalog._NOUNS, i)[:3]), "light", None),
+        ("search_categories", lambda i: db.search_categories(f"Category {i}"), "light", None),
+        ("iter_products", lambda i: _exhaust(db.iter_products()), "heavy", None),
+        ("iter_product_prices", lambda i: _exhaust(db.iter_product_prices()), "heavy", None),
+        ("iter_categories (tree_order)", lambda i: _exhaust(db.iter_categories(tree_order=True)), "heavy", None),
+        ("add_products_bulk (1000 rows)", lambda i: db.add_products_bulk(bulk_rows), "heavy", None),
+        ("add_categories_bulk (1000 rows)",
+         lambda i: db.add_categories_bulk(
+             {"name": f"bulk category {next(bulk_categories)}", "parent_id": pick(sample_categories, n)}
+             for n in range(1000)), "heavy", None),
+        ("insert_missing_categories (100 names)", insert_missing_categories, "light", None),
+        ("set_category_parents (100 moves)", set_category_parents, "light", None),
+        ("delete_categories_by_name (100 names)",
+         lambda i: db.delete_categories_by_name(synced_categories.pop()), "light", None),
+        ("upsert_products (1000 inserts)", upsert_inserts, "heavy", None),
+        ("upsert_products (1000 updates)", lambda i: db.upsert_products(update_rows), "heavy", None),
+        ("delete_products (1000 ids)", lambda i: db.delete_products(synced_products.pop()), "heavy", None),
+        ("get_change_seq", lambda i: db.get_change_seq(), "light", None),
+        ("get_changes_since (oldest 1000)", lambda i: db.get_changes_since(0, 1000), "light", None),
+        ("get_changes_since (latest 100)",
+         lambda i: db.get_changes_since(max(db.get_change_seq() - 100, 0)), "light", None),
+        ("compact_change_log (within bound)", lambda i: db.compact_change_log(), "light", None),
+        ("gui: hierarchy roots", _gui_hierarchy_roots, "light", None),
+        ("gui: expand node", lambda i: _gui_expand_node(pick(sample_categories, i)), "light", None),
+        ("gui: full tree with products grouped", _gui_full_tree, "heavy", None),
+    ]
+
+
+def _depth(parents, i):
+    depth = 0
+    while parents[i] is not None:
+        i = parents[i]
+        depth += 1
+    return depth
+
+
+def run(shape, categories, products, seed=0, repeat=200, heavy_repeat=3, only=None):
+    """Generate a catalog in a temporary directory and time every scenario.
+    Returns the result document written by main()."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        load_seconds = catalog.generate(shape, categories, products, seed)
+        results = {}
+        for name, fn, kind, setup in build_scenarios(shape, categories, products, seed):
+            if only and only not in name:
+                continue
+            results[name] = time_scenario(fn, repeat if kind == "light" else heavy_repeat, setup)
+            print(f"{name:<42}{results[name]['median_ms']:>12.3f} ms", file=sys.stderr)
+        db.close_database()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "shape": shape,
+            "categories": categories,
+            "products": products,
+            "seed": seed,
+            "generate_seconds": load_seconds,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline):
+    """Print median time per scenario against a baseline result document."""
+    print(f"{'scenario':<42}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<42}{'-':>14}{result['median_ms']:>14.3f}{'new':>8}")
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        print(f"{name:<42}{before['median_ms']:>14.3f}{result['median_ms']:>14.3f}{ratio:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shape", choices=catalog.SHAPES, default="balanced")
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=200, help="runs per light scenario")
+    parser.add_argument("--heavy-repeat", type=int, default=3, help="runs per whole-table scenario")
+    parser.add_argument("--only", help="run only scenarios whose name contains this text")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    result = run(args.shape, args.categories, args.products, args.seed, args.repeat, args.heavy_repeat, args.only)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    elif not args.baseline:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
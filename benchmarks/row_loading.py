@@ -0,0 +1,55 @@
+"""Time and memory of a full product listing as dicts, models and tuples.
+
+Run from the project root:
+    python -m benchmarks.row_loading [--products 1000000]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import database.db_manager as db
+from benchmarks import catalog
+
+
+def _measure(row_type, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = db.get_all_products(row_type=row_type)
+        best = min(best, time.perf_counter() - start)
+        del rows
+
+    # Memory is measured on a separate run: tracemalloc slows allocation down
+    gc.collect()
+    tracemalloc.start()
+    rows = db.get_all_products(row_type=row_type)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+    return count, best, held, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        catalog.generate("balanced", args.categories, args.products)
+        print(f"{'row type':<10}{'rows':>10}{'best (s)':>11}{'held (MB)':>12}{'peak (MB)':>12}{'bytes/row':>11}")
+        for row_type in db.ROW_TYPES:
+            count, seconds, held, peak = _measure(row_type, args.repeat)
+            print(f"{row_type:<10}{count:>10}{seconds:>11.2f}{held / 1e6:>12.1f}{peak / 1e6:>12.1f}{held / max(count, 1):>11.0f}")
+        db.close_database()
+
+
+if __name__ == "__main__":
+    main()
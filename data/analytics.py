@@ -0,0 +1,281 @@
+"""Price analytics over the whole catalog, computed with NumPy.
+
+Prices and category ids are read from SQLite straight into arrays, a batch
+at a time, without building a dict per product. Every aggregate is then a
+few vectorized passes: bincount and ufunc.at for per-category counts, sums,
+minimums and maximums, a deepest-first walk of the category parent array to
+roll them up into subtrees, one sort for per-category percentiles and
+bincount again for price histograms.
+
+NumPy is only needed by this module: the rest of the project works without
+it, and calling in here without it raises RuntimeError.
+
+Usage:
+    python -m data.analytics [--percentiles 50 90 99] [--bins 10] [-o report.json]
+"""
+import argparse
+import itertools
+import json
+import sys
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import database.db_manager as db
+
+LOAD_BATCH_SIZE = db.STREAM_BATCH_SIZE * 64
+DEFAULT_PERCENTILES = (50, 90, 99)
+DEFAULT_BINS = 10
+
+# category_ids: every category id, ascending. parents: index of each one's
+# parent in category_ids (-1 for roots). prices: every product price.
+# product_categories: index of each product's category (-1 if uncategorized).
+Catalog = namedtuple("Catalog", "category_ids parents prices product_categories")
+
+_loaded = {}    # DB_NAME -> (data version, Catalog)
+_PRODUCT_ROW = np.dtype([("price", np.float64), ("category", np.int64)]) if np is not None else None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("data.analytics needs NumPy: pip install numpy")
+
+
+def load_catalog(batch_size=LOAD_BATCH_SIZE):
+    """Read the catalog into a Catalog of arrays. The result is kept until
+    db_manager.get_data_version() changes, so repeated reports between
+    writes skip the read; treat the arrays as read-only."""
+    _require_numpy()
+    version = db.get_data_version()
+    cached = _loaded.get(db.DB_NAME)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    categories = np.array([(c[0], c[2] or 0) for c in db.get_all_categories(row_type="tuple")],
+                          dtype=np.int64).reshape(-1, 2)
+    categories = categories[np.argsort(categories[:, 0])]
+    # Batch by batch, so only one batch of row tuples is alive at a time
+    rows = db.iter_product_prices(batch_size)
+    chunks = []
+    while True:
+        chunk = np.fromiter(itertools.islice(rows, batch_size), dtype=_PRODUCT_ROW)
+        if not len(chunk):
+            break
+        chunks.append(chunk)
+    products = np.concatenate(chunks) if chunks else np.empty(0, dtype=_PRODUCT_ROW)
+
+    ids = categories[:, 0]
+    catalog = Catalog(ids, _index_of(ids, categories[:, 1]), products["price"], _index_of(ids, products["category"]))
+    _loaded[db.DB_NAME] = (version, catalog)
+    return catalog
+
+
+def _index_of(ids, values):
+    """Positions of values in the sorted ids array; -1 where a value isn't there."""
+    positions = np.searchsorted(ids, values)
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == values[found]
+    return np.where(found, positions, -1)
+
+
+def _depths(parents):
+    """Depth of every category (roots are 0), one vector step per level."""
+    depth = np.zeros(len(parents), dtype=np.int64)
+    current = parents.copy()
+    # Bounded by the number of categories in case legacy data has a cycle
+    for _ in range(len(parents)):
+        above = current >= 0
+        if not above.any():
+            break
+        depth += above
+        current[above] = parents[current[above]]
+    return depth
+
+
+def _roll_up(parents, values, combine):
+    """Fold each category's values into all of its ancestors, deepest level
+    first, with combine (a ufunc such as np.add). values may have extra
+    dimensions (e.g. one histogram row per category)."""
+    rolled = values.copy()
+    depth = _depths(parents)
+    for level in range(int(depth.max(initial=0)), 0, -1):
+        nodes = np.flatnonzero(depth == level)
+        nodes = nodes[parents[nodes] >= 0]
+        combine.at(rolled, parents[nodes], rolled[nodes])
+    return rolled
+
+
+def category_aggregates(catalog=None):
+    """Per-category price aggregates, aligned with catalog.category_ids.
+    Returns {"direct": {...}, "subtree": {...}} where each holds "count",
+    "sum", "min", "max" and "mean" arrays; min, max and mean are NaN for
+    categories without products."""
+    _require_numpy()
+    catalog = catalog or load_catalog()
+    size = len(catalog.category_ids)
+    categorized = catalog.product_categories >= 0
+    index = catalog.product_categories[categorized]
+    prices = catalog.prices[categorized]
+
+    count = np.bincount(index, minlength=size)
+    total = np.bincount(index, weights=prices, minlength=size)
+    low = np.full(size, np.inf)
+    np.minimum.at(low, index, prices)
+    high = np.full(size, -np.inf)
+    np.maximum.at(high, index, prices)
+
+    result = {}
+    for scope, values in (
+            ("direct", (count, total, low, high)),
+            ("subtree", [_roll_up(catalog.parents, v, ufunc)
+                         for v, ufunc in zip((count, total, low, high), (np.add, np.add, np.minimum, np.maximum))])):
+        count_, total_, low_, high_ = values
+        empty = count_ == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total_ / count_
+        result[scope] = {
+            "count": count_,
+            "sum": total_,
+            "min": np.where(empty, np.nan, low_),
+            "max": np.where(empty, np.nan, high_),
+            "mean": np.where(empty, np.nan, mean),
+        }
+    return result
+
+
+def price_percentiles(percentiles=DEFAULT_PERCENTILES, catalog=None, by_category=False):
+    """Price percentiles (0-100, linear interpolation like np.percentile).
+    Returns one value per percentile over all products, or with by_category
+    an array of shape (categories, percentiles) over each category's own
+    products (NaN rows for categories without any)."""
+    _require_numpy()
+    catalog = catalog or load_catalog()
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    if not by_category:
+        if not len(catalog.prices):
+            return np.full(len(q), np.nan)
+        return np.quantile(catalog.prices, q)
+
+    # Sorted by (category, price), each category is a contiguous run and every
+    # percentile an interpolation between two positions in it. load_catalog()
+    # reads rows in that order already, which leaves only the check.
+    size = len(catalog.category_ids)
+    categorized = catalog.product_categories >= 0
+    index = catalog.product_categories[categorized]
+    prices = catalog.prices[categorized]
+    sorted_runs = (np.all(index[1:] >= index[:-1])
+                   and np.all((prices[1:] >= prices[:-1]) | (index[1:] != index[:-1])))
+    if not sorted_runs:
+        order = np.lexsort((prices, index))
+        index, prices = index[order], prices[order]
+    count = np.bincount(index, minlength=size)
+    start = np.cumsum(count) - count
+
+    position = start[:, None] + (np.maximum(count, 1)[:, None] - 1) * q[None, :]
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, start[:, None] + np.maximum(count, 1)[:, None] - 1)
+    result = np.full((size, len(q)), np.nan)
+    has = count > 0
+    if has.any():
+        fraction = position[has] - below[has]
+        result[has] = prices[below[has]] * (1 - fraction) + prices[above[has]] * fraction
+    return result
+
+
+def price_histogram(bins=DEFAULT_BINS, catalog=None, by_category=False, subtree=False):
+    """Histogram of prices over equal-width bins spanning all prices (or
+    explicit bin edges). Returns (edges, counts): counts has one entry per
+    bin, or with by_category one row per category, counting the category's
+    own products or, with subtree, everything below it too."""
+    _require_numpy()
+    catalog = catalog or load_catalog()
+    edges = np.histogram_bin_edges(catalog.prices, bins=bins)
+    if not by_category:
+        return edges, np.histogram(catalog.prices, bins=edges)[0]
+
+    bin_count = len(edges) - 1
+    size = len(catalog.category_ids)
+    categorized = catalog.product_categories >= 0
+    prices = catalog.prices[categorized]
+    # Same bins as np.histogram: half-open, except the last one includes its right edge
+    bin_index = np.clip(np.searchsorted(edges, prices, side="right") - 1, 0, bin_count - 1)
+    inside = (prices >= edges[0]) & (prices <= edges[-1])
+    cells = catalog.product_categories[categorized][inside] * bin_count + bin_index[inside]
+    counts = np.bincount(cells, minlength=size * bin_count).reshape(size, bin_count)
+    if subtree:
+        counts = _roll_up(catalog.parents, counts, np.add)
+    return edges, counts
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def price_report(percentiles=DEFAULT_PERCENTILES, bins=DEFAULT_BINS):
+    """Everything above as plain JSON-ready data: catalog-wide price
+    summary, percentiles and histogram, plus direct and subtree aggregates
+    and direct percentiles for every category."""
+    catalog = load_catalog()
+    aggregates = category_aggregates(catalog)
+    by_category = price_percentiles(percentiles, catalog, by_category=True)
+    edges, counts = price_histogram(bins, catalog)
+    names = db.get_category_map()
+    prices = catalog.prices
+    labels = [f"p{p:g}" for p in percentiles]
+
+    categories = []
+    for i, category_id in enumerate(catalog.category_ids.tolist()):
+        entry = {"id": category_id, "name": names.get(category_id, {}).get("name")}
+        for scope in ("direct", "subtree"):
+            values = aggregates[scope]
+            entry[scope] = {
+                "count": int(values["count"][i]),
+                "sum": round(float(values["sum"][i]), 4),
+                "min": _number(values["min"][i]),
+                "max": _number(values["max"][i]),
+                "mean": _number(values["mean"][i]),
+            }
+        entry["direct"]["percentiles"] = dict(zip(labels, map(_number, by_category[i])))
+        categories.append(entry)
+
+    return {
+        "products": int(len(prices)),
+        "uncategorized": int(np.count_nonzero(catalog.product_categories < 0)),
+        "price": {
+            "min": _number(prices.min()) if len(prices) else None,
+            "max": _number(prices.max()) if len(prices) else None,
+            "mean": _number(prices.mean()) if len(prices) else None,
+            "percentiles": dict(zip(labels, map(_number, price_percentiles(percentiles, catalog)))),
+        },
+        "histogram": {"edges": [round(float(e), 4) for e in edges], "counts": counts.tolist()},
+        "categories": categories,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print price analytics for the catalog as JSON.")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=list(DEFAULT_PERCENTILES))
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS)
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("data.analytics needs NumPy: pip install numpy", file=sys.stderr)
+        return 1
+    db.initialize_database()
+    report = price_report(args.percentiles, args.bins)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
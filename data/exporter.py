@@ -0,0 +1,112 @@
+"""Export the catalog as CSV, NDJSON or a nested JSON hierarchy.
+
+Rows are streamed from db_manager's iter_* generators and written as they
+arrive, so peak memory stays flat however large the tables are.
+
+Usage:
+    python -m data.exporter products --format csv -o products.csv
+    python -m data.exporter categories --format ndjson
+    python -m data.exporter hierarchy -o tree.json
+"""
+import argparse
+import csv
+import json
+import sys
+
+import database.db_manager as db
+
+PRODUCT_FIELDS = ("id", "name", "price", "category_id", "category_name", "category_path")
+CATEGORY_FIELDS = ("id", "name", "parent_id")
+
+
+def write_csv(rows, file, fields):
+    writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_ndjson(rows, file):
+    count = 0
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def write_hierarchy_json(nodes, file):
+    """Write depth-first nodes (as yielded by iter_categories(tree_order=True))
+    as a nested JSON array of {id, name, children}. Only the chain of open
+    ancestors is kept in memory."""
+    open_depth = -1         # depth of the innermost node whose children list is open
+    need_comma = False
+    count = 0
+    file.write("[")
+    for node in nodes:
+        depth = node["depth"]
+        while open_depth >= depth:
+            file.write("]}")
+            open_depth -= 1
+            need_comma = True
+        if need_comma:
+            file.write(",")
+        file.write(f'{{"id": {json.dumps(node["id"])}, "name": {json.dumps(node["name"], ensure_ascii=False)}, "children": [')
+        open_depth = depth
+        need_comma = False
+        count += 1
+    file.write("]}" * (open_depth + 1))
+    file.write("]\n")
+    return count
+
+
+def export_products(file, fmt="csv", batch_size=db.STREAM_BATCH_SIZE):
+    rows = db.iter_products(batch_size=batch_size, include_path=True)
+    if fmt == "csv":
+        return write_csv(rows, file, PRODUCT_FIELDS)
+    return write_ndjson(rows, file)
+
+
+def export_categories(file, fmt="csv", batch_size=db.STREAM_BATCH_SIZE):
+    rows = db.iter_categories(batch_size=batch_size)
+    if fmt == "csv":
+        return write_csv(rows, file, CATEGORY_FIELDS)
+    return write_ndjson(rows, file)
+
+
+def export_hierarchy(file, batch_size=db.STREAM_BATCH_SIZE):
+    return write_hierarchy_json(db.iter_categories(batch_size=batch_size, tree_order=True), file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export products, categories or the category tree.")
+    parser.add_argument("kind", choices=("products", "categories", "hierarchy"))
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv",
+                        help="row format for products/categories (hierarchy is always JSON)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    db.DB_NAME = args.db
+    db.initialize_database()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.kind == "products":
+            count = export_products(out, args.format)
+        elif args.kind == "categories":
+            count = export_categories(out, args.format)
+        else:
+            count = export_hierarchy(out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    label = "products" if args.kind == "products" else "categories"
+    print(f"Exported {count} {label}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+"""Stream supplier catalogs from CSV or JSON into the database.
+
+Rows are read lazily and handed to db_manager's bulk APIs, so memory use does
+not depend on file size. Product files need "name" and "price" plus either
+"category" (name) or "category_id"; category files need "name" and optionally
+"parent" (name) or "parent_id".
+
+Usage:
+    python -m data.importer categories categories.csv
+    python -m data.importer products catalog.ndjson
+"""
+import argparse
+import csv
+import json
+import os
+
+import database.db_manager as db
+
+FORMATS = ("csv", "json", "ndjson")
+
+
+def read_csv(file):
+    """Yield one dict per CSV row, keyed by the header line."""
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    """Yield one object per non-blank line."""
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json_array(file, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        # Skip separators between values
+        buffer = buffer.lstrip()
+        if not started and buffer.startswith("["):
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer.startswith(","):
+            buffer = buffer[1:]
+            continue
+        if started and buffer.startswith("]"):
+            return
+        if buffer:
+            if not started:
+                raise ValueError("Expected a JSON array of objects.")
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield value
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise ValueError("Unexpected end of JSON input.")
+        data = file.read(chunk_size)
+        if not data:
+            eof = True
+        buffer += data
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext == "jsonl":
+        return "ndjson"
+    return ext if ext in FORMATS else "csv"
+
+
+def read_rows(file, fmt):
+    if fmt == "csv":
+        return read_csv(file)
+    if fmt == "ndjson":
+        return read_ndjson(file)
+    if fmt == "json":
+        return read_json_array(file)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def import_products(path, fmt=None, chunk_size=db.BULK_CHUNK_SIZE):
+    """Load products from a file. Returns the add_products_bulk result."""
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        return db.add_products_bulk(read_rows(f, fmt), chunk_size=chunk_size)
+
+
+def import_categories(path, fmt=None, chunk_size=db.BULK_CHUNK_SIZE):
+    """Load categories from a file. Returns the add_categories_bulk result."""
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        return db.add_categories_bulk(read_rows(f, fmt), chunk_size=chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import categories or products from CSV/JSON.")
+    parser.add_argument("kind", choices=("categories", "products"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=db.BULK_CHUNK_SIZE)
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    db.DB_NAME = args.db
+    db.initialize_database()
+    load = import_categories if args.kind == "categories" else import_products
+    result = load(args.path, args.format, args.chunk_size)
+
+    print(f"Imported {result['inserted']} {args.kind}, {len(result['errors'])} rejected.")
+    for error in result["errors"]:
+        print(f"  row {error['row']}: {error['message']}")
+    return 0 if not result["errors"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,405 @@
+"""Bring the catalog in line with a full snapshot, writing only what changed.
+
+A snapshot is a categories file (name, parent) and/or a products file (name,
+price, category), in any format data.importer reads. Rows are matched to the
+database by name, the natural key: categories names are unique, and products
+sharing a name pair up in id order with the snapshot's rows in file order.
+Categories are referenced by name too, never by id.
+
+Both sides are streamed in key order and merge-joined, so memory stays
+bounded whatever the catalog size. The snapshot is first copied into a
+scratch SQLite file with a content hash per row and read back sorted; the
+database is read through a connection of its own, whose view of a table
+doesn't move while the writes commit. Rows whose hashes match are left
+alone; the rest become batched inserts, updates (UPSERT), deletes and
+category moves, one transaction per batch.
+
+Category errors stop the sync before anything is written, since a broken
+tree would move or delete the wrong categories. A product row with errors
+is skipped, and database products of the same name are kept as they are.
+
+Usage:
+    python -m data.sync [--categories categories.csv] [--products products.csv] [--dry-run]
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import sqlite3
+import tempfile
+from operator import itemgetter
+
+import database.db_manager as db
+from database.connection import open_connection
+from data.importer import FORMATS, detect_format, read_rows
+from utils.validator import is_not_empty, is_valid_price
+
+SYNC_BATCH_SIZE = db.BULK_CHUNK_SIZE
+MAX_REPORTED_ERRORS = 1000
+
+_STAGING_SCHEMA = """
+CREATE TABLE categories (row INTEGER PRIMARY KEY, name TEXT NOT NULL, parent TEXT, hash BLOB);
+CREATE INDEX idx_categories_name ON categories(name, row);
+CREATE TABLE products (row INTEGER PRIMARY KEY, name TEXT NOT NULL, price REAL, category TEXT, hash BLOB);
+CREATE INDEX idx_products_name ON products(name, row);
+CREATE TABLE known_categories (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE category_moves (name TEXT PRIMARY KEY, parent TEXT) WITHOUT ROWID;
+CREATE TABLE category_deletes (name TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+
+def _content_hash(*values):
+    """Digest of a row's non-key columns, computed the same way on both sides."""
+    return hashlib.blake2b(repr(values).encode(), digest_size=16).digest()
+
+
+def _category_hash(row):
+    """Hash of a database (name, parent name) row."""
+    return _content_hash(row[1])
+
+
+def _product_hash(row):
+    """Hash of a database (name, id, price, category name) row."""
+    return _content_hash(row[2], row[3])
+
+
+def _merge(live, staged):
+    """Walk two iterables of rows sorted by their first column, the key, and
+    yield (live rows, staged rows) for every key; one list may be empty."""
+    live = itertools.groupby(live, key=itemgetter(0))
+    staged = itertools.groupby(staged, key=itemgetter(0))
+    a, b = next(live, None), next(staged, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield list(a[1]), []
+            a = next(live, None)
+        elif a is None or b[0] < a[0]:
+            yield [], list(b[1])
+            b = next(staged, None)
+        else:
+            yield list(a[1]), list(b[1])
+            a, b = next(live, None), next(staged, None)
+
+
+def _pair(current, wanted, current_hash):
+    """Pair one key's database rows with its snapshot rows (hash last): equal
+    content first, so duplicates listed in another order aren't updates,
+    then the rest in order. Yields (current, wanted, unchanged) with None
+    on the side that ran out."""
+    if len(current) == 1 and len(wanted) == 1:
+        yield current[0], wanted[0], current_hash(current[0]) == wanted[0][-1]
+        return
+    by_hash = {}
+    for i, row in enumerate(wanted):
+        by_hash.setdefault(row[-1], []).append(i)
+    used = set()
+    rest = []
+    for row in current:
+        matches = by_hash.get(current_hash(row))
+        if matches:
+            i = matches.pop(0)
+            used.add(i)
+            yield row, wanted[i], True
+        else:
+            rest.append(row)
+    for row, other in itertools.zip_longest(rest, [row for i, row in enumerate(wanted) if i not in used]):
+        yield row, other, False
+
+
+class _Writer:
+    """Queues rows for one db_manager writer and applies them a batch at a time."""
+
+    def __init__(self, write, summary, size, dry_run):
+        self.write = write
+        self.summary = summary
+        self.size = size
+        self.dry_run = dry_run
+        self.pending = []
+        self.totals = {}
+
+    def add(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def add_all(self, rows):
+        for row in rows:
+            self.add(row)
+        self.flush()
+
+    def flush(self):
+        if self.pending and not self.dry_run:
+            result = self.write(self.pending)
+            if result["status"] != "success":
+                _error(self.summary, None, result["message"])
+            for key, value in result.items():
+                if isinstance(value, int):
+                    self.totals[key] = self.totals.get(key, 0) + value
+        self.pending = []
+
+
+def _error(summary, row, message):
+    summary["error_count"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append({"row": row, "message": message})
+
+
+def _open_staging(directory):
+    staging = sqlite3.connect(os.path.join(directory, "staging.db"))
+    staging.execute("PRAGMA journal_mode = OFF")
+    staging.execute("PRAGMA synchronous = OFF")
+    staging.executescript(_STAGING_SCHEMA)
+    return staging
+
+
+def _stage_categories(staging, rows, summary):
+    """Copy category rows into staging and check they form a tree. Returns
+    False if they don't."""
+    errors_before = summary["error_count"]
+    staged = []
+    for position, row in enumerate(rows, 1):
+        name = row.get("name")
+        if not isinstance(name, str) or not is_not_empty(name):
+            _error(summary, position, "Category name is empty.")
+            continue
+        parent = row.get("parent")
+        if row.get("parent_id") not in (None, "") and parent in (None, ""):
+            _error(summary, position, "Snapshots name the parent category; parent_id is not supported.")
+            continue
+        parent = parent.strip() if isinstance(parent, str) and parent.strip() else None
+        staged.append((position, name.strip(), parent, _content_hash(parent)))
+        if len(staged) >= SYNC_BATCH_SIZE:
+            staging.executemany("INSERT INTO categories VALUES (?, ?, ?, ?)", staged)
+            staged = []
+    staging.executemany("INSERT INTO categories VALUES (?, ?, ?, ?)", staged)
+
+    checks = (
+        ("SELECT row, name FROM categories c WHERE row > (SELECT MIN(row) FROM categories WHERE name = c.name)",
+         "Category '{}' appears more than once."),
+        ("SELECT row, parent FROM categories WHERE parent NOT IN (SELECT name FROM categories)",
+         "Parent category '{}' not found."),
+        # Whatever can't be reached from the top of the tree is in or under a cycle
+        ("""
+         WITH RECURSIVE reached(name) AS (
+             SELECT name FROM categories WHERE parent IS NULL OR parent NOT IN (SELECT name FROM categories)
+             UNION
+             SELECT c.name FROM categories c JOIN reached r ON c.parent = r.name
+         )
+         SELECT MIN(row), name FROM categories WHERE name NOT IN reached GROUP BY name
+         """,
+         "Category '{}' is in or under a parent cycle."),
+    )
+    for sql, message in checks:
+        for position, value in staging.execute(sql):
+            _error(summary, position, message.format(value))
+    staging.execute("INSERT INTO known_categories SELECT DISTINCT name FROM categories")
+    staging.commit()
+    return summary["error_count"] == errors_before
+
+
+def _stage_products(staging, rows, summary):
+    """Copy product rows into staging. Rows with errors are kept without a
+    hash, which marks their name as present but not to be written."""
+    staged = []
+    for position, row in enumerate(rows, 1):
+        name = row.get("name")
+        if not isinstance(name, str) or not is_not_empty(name):
+            _error(summary, position, "Product name is empty.")
+            continue
+        price, category = row.get("price"), row.get("category")
+        category = category if category not in (None, "") else None
+        content_hash = None
+        if not is_valid_price(price):
+            _error(summary, position, f"Invalid price: {price!r}.")
+            price = None
+        elif row.get("category_id") not in (None, "") and category is None:
+            _error(summary, position, "Snapshots name the category; category_id is not supported.")
+        else:
+            price = float(price)
+            content_hash = _content_hash(price, category)
+        staged.append((position, name.strip(), price, category, content_hash))
+        if len(staged) >= SYNC_BATCH_SIZE:
+            staging.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?)", staged)
+            staged = []
+    staging.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?)", staged)
+
+    unknown = """
+        FROM products WHERE hash IS NOT NULL AND category IS NOT NULL
+        AND category NOT IN (SELECT name FROM known_categories)
+    """
+    for position, category in staging.execute(f"SELECT row, category {unknown}"):
+        _error(summary, position, f"Category '{category}' not found.")
+    staging.execute(f"UPDATE products SET hash = NULL WHERE row IN (SELECT row {unknown})")
+    staging.commit()
+
+
+def _sync_categories(source, staging, summary, batch_size, dry_run):
+    counts = summary["categories"]
+    inserts = _Writer(db.insert_missing_categories, summary, batch_size, dry_run)
+    live = source.execute(
+        "SELECT c.name, p.name FROM categories c LEFT JOIN categories p ON p.id = c.parent_id ORDER BY c.name"
+    )
+    snapshot = staging.execute("SELECT name, parent, hash FROM categories ORDER BY name")
+    pairs = (pair for group in _merge(live, snapshot) for pair in _pair(*group, _category_hash))
+    for current, wanted, unchanged in pairs:
+        if wanted is None:
+            staging.execute("INSERT INTO category_deletes VALUES (?)", (current[0],))
+            counts["deleted"] += 1
+        elif current is None:
+            inserts.add(wanted[0])
+            if wanted[1] is not None:
+                staging.execute("INSERT INTO category_moves VALUES (?, ?)", wanted[:2])
+            counts["inserted"] += 1
+        elif unchanged:
+            counts["unchanged"] += 1
+        else:
+            staging.execute("INSERT INTO category_moves VALUES (?, ?)", wanted[:2])
+            counts["reparented"] += 1
+    inserts.flush()
+    staging.commit()
+
+    # Detach every category that moves or goes away, then attach the movers
+    # to their new parents: each step leaves a subset of the final tree, so
+    # no step can close a cycle or strand a child of a deleted category.
+    moves = _Writer(db.set_category_parents, summary, batch_size, dry_run)
+    moves.add_all(
+        (name, None) for (name,) in staging.execute(
+            "SELECT name FROM category_moves UNION ALL SELECT name FROM category_deletes")
+    )
+    moves.add_all(staging.execute("SELECT name, parent FROM category_moves WHERE parent IS NOT NULL"))
+
+
+def _sync_products(source, staging, summary, batch_size, dry_run):
+    counts = summary["products"]
+    upserts = _Writer(db.upsert_products, summary, batch_size, dry_run)
+    deletes = _Writer(db.delete_products, summary, batch_size, dry_run)
+    live = source.execute(
+        """
+        SELECT p.name, p.id, p.price, c.name
+        FROM products p
+        LEFT JOIN categories c ON c.id = p.category_id
+        ORDER BY p.name, p.id
+        """
+    )
+    snapshot = staging.execute("SELECT name, price, category, hash FROM products ORDER BY name, row")
+    pairs = (pair for group in _merge(live, snapshot) for pair in _pair(*group, _product_hash))
+    for current, wanted, unchanged in pairs:
+        if wanted is None:
+            deletes.add(current[1])
+            counts["deleted"] += 1
+        elif wanted[3] is None:
+            counts["skipped"] += 1
+        elif current is None:
+            upserts.add((None,) + wanted[:3])
+            counts["inserted"] += 1
+        elif unchanged:
+            counts["unchanged"] += 1
+        else:
+            upserts.add((current[1],) + wanted[:3])
+            counts["updated"] += 1
+    upserts.flush()
+    deletes.flush()
+
+
+def sync_catalog(categories=None, products=None, dry_run=False, batch_size=SYNC_BATCH_SIZE):
+    """Make the database match a snapshot. categories and products are
+    iterables of row dicts, as data.importer.read_rows yields them; leave one
+    out to sync only the other. With dry_run nothing is written and the
+    summary shows what would change.
+
+    Returns {"status", "dry_run", "categories": {"inserted", "reparented",
+    "deleted", "unchanged"}, "products": {"inserted", "updated", "deleted",
+    "unchanged", "skipped", "uncategorized"}, "errors": [...],
+    "error_count"}; errors are {"row": <1-based position>, "message": ...},
+    at most MAX_REPORTED_ERRORS of them."""
+    summary = {
+        "status": "success",
+        "dry_run": dry_run,
+        "categories": dict.fromkeys(("inserted", "reparented", "deleted", "unchanged"), 0),
+        "products": dict.fromkeys(("inserted", "updated", "deleted", "unchanged", "skipped", "uncategorized"), 0),
+        "errors": [],
+        "error_count": 0,
+    }
+    # Reads go through a connection of their own: each query sees the tables
+    # as they were when it started while db_manager commits the changes.
+    source = open_connection(db.DB_NAME)
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            staging = _open_staging(scratch)
+            try:
+                if categories is not None:
+                    if not _stage_categories(staging, categories, summary):
+                        summary["status"] = "error"
+                        return summary
+                else:
+                    staging.executemany("INSERT INTO known_categories VALUES (?)",
+                                        source.execute("SELECT name FROM categories"))
+                if products is not None:
+                    _stage_products(staging, products, summary)
+
+                if categories is not None:
+                    _sync_categories(source, staging, summary, batch_size, dry_run)
+                if products is not None:
+                    _sync_products(source, staging, summary, batch_size, dry_run)
+                if categories is not None:
+                    deletes = _Writer(db.delete_categories_by_name, summary, batch_size, dry_run)
+                    deletes.add_all(name for (name,) in staging.execute("SELECT name FROM category_deletes"))
+                    summary["products"]["uncategorized"] = deletes.totals.get("uncategorized", 0)
+            finally:
+                staging.close()
+    finally:
+        source.close()
+
+    if not dry_run:
+        db.compact_change_log()
+    if summary["error_count"]:
+        summary["status"] = "error"
+    return summary
+
+
+def sync_files(categories_path=None, products_path=None, fmt=None, dry_run=False, batch_size=SYNC_BATCH_SIZE):
+    """sync_catalog() over snapshot files; fmt defaults to each file's extension."""
+    files = []
+    try:
+        rows = []
+        for path in (categories_path, products_path):
+            if path is None:
+                rows.append(None)
+                continue
+            f = open(path, newline="", encoding="utf-8")
+            files.append(f)
+            rows.append(read_rows(f, fmt or detect_format(path)))
+        return sync_catalog(rows[0], rows[1], dry_run=dry_run, batch_size=batch_size)
+    finally:
+        for f in files:
+            f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync the catalog to a full snapshot, applying only the differences.")
+    parser.add_argument("--categories", help="categories snapshot (name, parent)")
+    parser.add_argument("--products", help="products snapshot (name, price, category)")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to each file's extension")
+    parser.add_argument("--dry-run", action="store_true", help="report the differences without writing")
+    parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE)
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.categories is None and args.products is None:
+        parser.error("give --categories, --products or both")
+
+    db.DB_NAME = args.db
+    db.initialize_database()
+    result = sync_files(args.categories, args.products, args.format, args.dry_run, args.batch_size)
+
+    verb = "Would apply" if args.dry_run else "Applied"
+    for kind in ("categories", "products"):
+        counts = ", ".join(f"{value} {key}" for key, value in result[kind].items())
+        print(f"{verb} to {kind}: {counts}.")
+    print(f"{result['error_count']} rows rejected.")
+    for error in result["errors"]:
+        print(f"  row {error['row']}: {error['message']}")
+    return 0 if result["status"] == "success" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
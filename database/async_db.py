@@ -0,0 +1,184 @@
+"""Awaitable versions of the db_manager API for asyncio applications.
+
+Each coroutine runs the matching db_manager function on a worker thread and
+returns exactly what the sync function returns, so the event loop never
+blocks on SQLite. Reads share a pool of threads and run concurrently (WAL
+lets readers proceed alongside the writer); writes go through a single
+thread, so they apply one at a time in the order they were awaited. Every
+worker thread uses its own pooled connection.
+
+    from database import async_db
+    await async_db.initialize_database()
+    tree = await async_db.get_category_hierarchy()
+    async for product in async_db.iter_products():
+        ...
+"""
+import asyncio
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database.db_manager as db
+
+READ_WORKERS = 4
+
+_lock = threading.Lock()
+_executors = {}
+
+
+def _executor(kind):
+    with _lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            workers = READ_WORKERS if kind == "read" else 1
+            executor = _executors[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"db-{kind}")
+        return executor
+
+
+def shutdown(wait=True):
+    """Stop the worker threads. They are started again on the next call."""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+async def _run(kind, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(kind), functools.partial(fn, *args, **kwargs))
+
+
+def _reader(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await _run("read", fn, *args, **kwargs)
+    return wrapper
+
+
+def _writer(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await _run("write", fn, *args, **kwargs)
+    return wrapper
+
+# DATABASE
+
+initialize_database = _writer(db.initialize_database)
+get_data_version = _reader(db.get_data_version)
+
+# CATEGORY
+
+add_category = _writer(db.add_category)
+update_category = _writer(db.update_category)
+delete_category = _writer(db.delete_category)
+move_subtree = _writer(db.move_subtree)
+edit_category = _writer(db.edit_category)
+delete_subtree = _writer(db.delete_subtree)
+merge_categories = _writer(db.merge_categories)
+get_all_categories = _reader(db.get_all_categories)
+get_category_map = _reader(db.get_category_map)
+get_category_id_map = _reader(db.get_category_id_map)
+get_category_index = _reader(db.get_category_index)
+
+# Tree helpers
+
+get_subcategories = _reader(db.get_subcategories)
+get_child_categories = _reader(db.get_child_categories)
+get_parent_category = _reader(db.get_parent_category)
+get_category_hierarchy = _reader(db.get_category_hierarchy)
+is_descendant = _reader(db.is_descendant)
+get_subtree_ids = _reader(db.get_subtree_ids)
+get_descendants = _reader(db.get_descendants)
+get_ancestors = _reader(db.get_ancestors)
+get_category_path = _reader(db.get_category_path)
+get_category_stats = _reader(db.get_category_stats)
+rebuild_category_closure = _writer(db.rebuild_category_closure)
+
+# PRODUCT
+
+add_product = _writer(db.add_product)
+update_product = _writer(db.update_product)
+delete_product = _writer(db.delete_product)
+get_all_products = _reader(db.get_all_products)
+get_product = _reader(db.get_product)
+get_products_by_category = _reader(db.get_products_by_category)
+get_products_in_subtree = _reader(db.get_products_in_subtree)
+get_products_page = _reader(db.get_products_page)
+query_products = _reader(db.query_products)
+
+# SEARCH
+
+search_products = _reader(db.search_products)
+search_categories = _reader(db.search_categories)
+
+# BULK
+
+add_products_bulk = _writer(db.add_products_bulk)
+add_categories_bulk = _writer(db.add_categories_bulk)
+
+# SYNC
+
+insert_missing_categories = _writer(db.insert_missing_categories)
+set_category_parents = _writer(db.set_category_parents)
+delete_categories_by_name = _writer(db.delete_categories_by_name)
+upsert_products = _writer(db.upsert_products)
+delete_products = _writer(db.delete_products)
+
+# CHANGE LOG
+
+get_change_seq = _reader(db.get_change_seq)
+get_changes_since = _reader(db.get_changes_since)
+compact_change_log = _writer(db.compact_change_log)
+
+# STREAMING
+
+
+async def _stream(make_iterator, batch_size):
+    # A cursor can only be used on the thread that opened it, so each stream
+    # gets a thread of its own for its whole lifetime and hands over one
+    # batch per round-trip to keep the hops off the per-row path.
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-stream")
+    iterator = None
+
+    def next_batch():
+        nonlocal iterator
+        if iterator is None:
+            iterator = make_iterator()
+        return list(itertools.islice(iterator, batch_size))
+
+    def close():
+        if iterator is not None:
+            iterator.close()
+        db.close_database()
+
+    try:
+        while True:
+            batch = await loop.run_in_executor(executor, next_batch)
+            if not batch:
+                return
+            for item in batch:
+                yield item
+    finally:
+        # Runs on exhaustion, errors and early exits (aclose()) alike
+        try:
+            await loop.run_in_executor(executor, close)
+        finally:
+            executor.shutdown(wait=False)
+
+
+def iter_products(batch_size=db.STREAM_BATCH_SIZE, include_path=False, row_type="dict"):
+    """Async iterator over the same rows as db_manager.iter_products."""
+    return _stream(lambda: db.iter_products(batch_size, include_path, row_type), batch_size)
+
+
+def iter_categories(batch_size=db.STREAM_BATCH_SIZE, tree_order=False):
+    """Async iterator over the same rows as db_manager.iter_categories."""
+    return _stream(lambda: db.iter_categories(batch_size, tree_order), batch_size)
+
+
+def iter_product_prices(batch_size=db.STREAM_BATCH_SIZE):
+    """Async iterator over the same rows as db_manager.iter_product_prices."""
+    return _stream(lambda: db.iter_product_prices(batch_size), batch_size)
@@ -0,0 +1,66 @@
+import threading
+
+TABLES = ("categories", "products")
+
+
+class VersionedCache:
+    """In-process cache for read-mostly query results.
+
+    Every entry records the generation of the tables it was built from.
+    Writes made through db_manager bump those generations via invalidate().
+    Commits from other connections (another process, or another thread's
+    pooled connection) are caught by PRAGMA data_version, which changes
+    whenever a different connection commits to the file. A cache hit costs
+    that one PRAGMA and no query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = dict.fromkeys(TABLES, 0)
+        self._entries = {}
+        self._local = threading.local()
+
+    def invalidate(self, *tables):
+        """Mark tables (all of them if none given) as changed."""
+        with self._lock:
+            for table in tables or TABLES:
+                self._generations[table] += 1
+
+    def check_external(self, conn, path):
+        """Invalidate everything if another connection committed to path
+        since this thread last looked. A connection seen for the first time
+        (a new thread, or a reopened one) has nothing to compare against and
+        may be looking at commits the cached entries predate, so it
+        invalidates too."""
+        seen = getattr(self._local, "data_versions", None)
+        if seen is None:
+            seen = self._local.data_versions = {}
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        previous = seen.get(path)
+        seen[path] = (conn, version)
+        if previous is None or previous[0] is not conn or previous[1] != version:
+            self.invalidate()
+
+    def version(self):
+        """A number that grows whenever any cached table may have changed."""
+        return sum(self._generations.values())
+
+    def get(self, key, depends_on, loader):
+        """Return the cached value for key, calling loader() to (re)build it
+        when any table in depends_on changed since it was stored."""
+        stamp = tuple(self._generations[t] for t in depends_on)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        # Stamp taken before loading: a write racing with the load leaves a
+        # stale stamp behind, so the next call reloads instead of trusting it.
+        value = loader()
+        self._entries[key] = (stamp, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = VersionedCache()
@@ -0,0 +1,52 @@
+from bisect import bisect_left
+
+
+class CategoryIndex:
+    """Type-ahead lookup over category paths.
+
+    Every category is indexed under its full path ("Electronics > Phones")
+    and its own name ("Phones"), case-insensitively, in one sorted array.
+    A prefix search is a bisect to the first candidate followed by a short
+    scan; turning a typed path or name back into an id is a dict lookup.
+    """
+
+    def __init__(self, rows):
+        """rows: (id, full path, name) for every category."""
+        self._paths = {}
+        self._ids = {}
+        entries = []
+        for category_id, path, name in rows:
+            self._paths[category_id] = path
+            for key in {path.casefold(), name.casefold()}:
+                self._ids.setdefault(key, category_id)
+                entries.append((key, category_id))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._key_ids = [category_id for _, category_id in entries]
+
+    def __len__(self):
+        return len(self._paths)
+
+    def search(self, text, limit=20, exclude=()):
+        """Return up to limit (id, path) pairs whose path or name starts with
+        text, in alphabetical order. Ids in exclude are skipped."""
+        prefix = text.strip().casefold()
+        results = []
+        seen = set(exclude)
+        for i in range(bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            category_id = self._key_ids[i]
+            if category_id not in seen:
+                seen.add(category_id)
+                results.append((category_id, self._paths[category_id]))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def resolve(self, text):
+        """Return the id of the category whose full path or name is text, or None."""
+        return self._ids.get(text.strip().casefold())
+
+    def path(self, category_id):
+        return self._paths.get(category_id)
@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+
+# Session settings applied once when a connection is opened.
+# busy_timeout goes first so switching the journal mode waits on a locked file.
+PRAGMAS = (
+    ("busy_timeout", 5000),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -32000),         # negative = KiB, so ~32 MB page cache
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),
+)
+
+
+def open_connection(path):
+    """Open a new tuned connection to path. The caller owns and closes it."""
+    conn = sqlite3.connect(path)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """Hands out one long-lived connection per thread and database path.
+
+    sqlite3 connections may only be used on the thread that created them,
+    so each thread gets its own, opened on first use and reused afterwards.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connections(self):
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        return conns
+
+    def get(self, path):
+        conns = self._connections()
+        conn = conns.get(path)
+        if conn is None:
+            conn = conns[path] = open_connection(path)
+        return conn
+
+    def close(self, path=None):
+        """Close this thread's connections (only the one for path, if given)."""
+        conns = self._connections()
+        paths = [path] if path is not None else list(conns)
+        for p in paths:
+            conn = conns.pop(p, None)
+            if conn is not None:
+                conn.close()
+
+
+_pool = ConnectionPool()
+
+
+def get_connection(path):
+    """Return the calling thread's pooled connection to path."""
+    return _pool.get(path)
+
+
+def close_connections(path=None):
+    """Close the calling thread's pooled connections."""
+    _pool.close(path)
@@ -1,87 +1,147 @@
+import itertools
+import json
+import re
 import sqlite3
+from database.cache import cache as _cache
+from database.category_index import CategoryIndex
+from database import metrics as _metrics
+from database.connection import get_connection, close_connections
+from database.migrations import (
+    has_fts, migrate,
+    rebuild_category_closure as _rebuild_category_closure,
+    rebuild_category_stats as _rebuild_category_stats,
+)
 from models.category import Category
 from models.product import Product
+from utils.validator import is_not_empty, is_valid_price
 
 DB_NAME = "inventory.db"
 
-# DATABASE INITIALIZATION
+# Shapes a listing can return its rows in (the row_type argument)
+ROW_TYPES = ("dict", "model", "tuple")
 
-def _column_exists(cursor, table, column):
-    cursor.execute(f"PRAGMA table_info({table})")
-    cols = [row[1] for row in cursor.fetchall()]
-    return column in cols
 
-def initialize_database():
-    """Create database and tables if not existing and ensure schema matches hierarchy needs."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def _connect():
+    """Return this thread's pooled connection to DB_NAME."""
+    conn = get_connection(DB_NAME)
+    if _metrics.active:
+        _metrics.watch(conn)
+    return conn
 
-    # Categories now support hierarchy via parent_id
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            parent_id INTEGER,
-            FOREIGN KEY (parent_id) REFERENCES categories(id)
-        )
-        """
-    )
 
-    # If table already existed without parent_id, add it
-    if not _column_exists(cursor, "categories", "parent_id"):
-        cursor.execute("ALTER TABLE categories ADD COLUMN parent_id INTEGER")
+def close_database():
+    """Close the calling thread's pooled connection to DB_NAME."""
+    close_connections(DB_NAME)
+
+
+def _cached(name, depends_on, loader):
+    """Serve loader()'s result from the in-process cache while the tables it
+    depends_on are unchanged. Cached values are shared: treat them as read-only."""
+    _cache.check_external(_connect(), DB_NAME)
+    return _cache.get((DB_NAME, name), depends_on, loader)
+
+
+def _changed(*tables):
+    """Record a committed write so cached reads of tables get rebuilt, and
+    keep the change log bounded in long-running processes."""
+    _cache.invalidate(*tables)
+    if next(_write_count) % CHANGE_LOG_COMPACT_INTERVAL == 0:
+        compact_change_log()
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            category_id INTEGER,
-            FOREIGN KEY (category_id) REFERENCES categories(id)
-        )
-        """
-    )
 
-    conn.commit()
-    conn.close()
+def _set_row_type(cursor, row_type, model, make_dict):
+    """Have cursor build rows as dicts (via make_dict), slotted model objects
+    or plain tuples, straight from sqlite3 without intermediate objects."""
+    if row_type == "dict":
+        cursor.row_factory = make_dict
+    elif row_type == "model":
+        cursor.row_factory = model.from_row
+    elif row_type != "tuple":
+        raise ValueError(f"Unsupported row type: {row_type}")
+    return cursor
+
+
+def _category_row_to_dict(cursor, row):
+    return {"id": row[0], "name": row[1], "parent_id": row[2]}
+
+
+@_metrics.timed
+def get_data_version():
+    """Return a number that changes whenever categories or products may have
+    changed, whether through this module or another connection."""
+    _cache.check_external(_connect(), DB_NAME)
+    return _cache.version()
+
+# DATABASE INITIALIZATION
+
+@_metrics.timed
+def initialize_database():
+    """Create the database if needed, apply any pending schema migrations and
+    compact the change log."""
+    if migrate(_connect()):
+        _changed()
+    compact_change_log()
     return True
 
 # CATEGORY
 
+@_metrics.timed
 def add_category(name, parent_id=None):
     """Insert a new category or subcategory.
     parent_id: optional existing category id to attach as parent
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    conn = _connect()
     try:
-        # Validate parent if provided
-        if parent_id is not None:
-            cursor.execute("SELECT id FROM categories WHERE id = ?", (parent_id,))
-            if cursor.fetchone() is None:
-                conn.close()
-                return {"status": "error", "message": "Parent category not found."}
-        cursor.execute("INSERT INTO categories (name, parent_id) VALUES (?, ?)", (name, parent_id))
-        conn.commit()
-        result = {"status": "success", "message": f"Category '{name}' added.", "id": cursor.lastrowid}
+        with conn:
+            cursor = conn.cursor()
+            # Validate parent if provided
+            if parent_id is not None:
+                cursor.execute("SELECT id FROM categories WHERE id = ?", (parent_id,))
+                if cursor.fetchone() is None:
+                    return {"status": "error", "message": "Parent category not found."}
+            cursor.execute("INSERT INTO categories (name, parent_id) VALUES (?, ?)", (name, parent_id))
+        _changed("categories")
+        return {"status": "success", "message": f"Category '{name}' added.", "id": cursor.lastrowid}
     except sqlite3.IntegrityError:
-        result = {"status": "error", "message": "Category already exists."}
-    conn.close()
-    return result
+        return {"status": "error", "message": "Category already exists."}
 
 
-def get_all_categories():
-    """Retrieve all categories with parent info."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, parent_id FROM categories")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Category(id=row[0], name=row[1], parent_id=row[2]).to_dict() for row in rows]
+@_metrics.timed
+def get_all_categories(row_type="dict"):
+    """Retrieve all categories with parent info (cached; don't modify the result).
+    row_type: "dict", "model" (Category objects) or "tuple" (id, name, parent_id)."""
+    def load():
+        cursor = _set_row_type(_connect().cursor(), row_type, Category, _category_row_to_dict)
+        return cursor.execute("SELECT id, name, parent_id FROM categories").fetchall()
+    return _cached(f"all_categories:{row_type}", ("categories",), load)
+
+
+@_metrics.timed
+def get_category_map():
+    """Return {id: category dict} for every category (cached; don't modify the result)."""
+    return _cached("category_map", ("categories",), lambda: {c["id"]: c for c in get_all_categories()})
+
+
+@_metrics.timed
+def get_category_id_map():
+    """Return {name: id} for every category (cached; don't modify the result)."""
+    return _cached("category_id_map", ("categories",), lambda: {c["name"]: c["id"] for c in get_all_categories()})
 
 
+@_metrics.timed
+def get_category_index():
+    """Return a CategoryIndex over every category's full path, for type-ahead
+    pickers (cached; don't modify the result)."""
+    def load():
+        cursor = _connect().execute(_CATEGORY_PATHS_CTE + """
+            SELECT c.id, COALESCE(cp.path, c.name), c.name
+            FROM categories c LEFT JOIN category_paths cp ON cp.id = c.id
+        """)
+        return CategoryIndex(cursor.fetchall())
+    return _cached("category_index", ("categories",), load)
+
+
+@_metrics.timed
 def update_category(category_id, new_name=None, new_parent_id=None):
     """Update a category name and/or parent.
     If a field is None it won't be updated.
@@ -90,32 +150,18 @@ def update_category(category_id, new_name=None, new_parent_id=None):
     if new_name is None and new_parent_id is None:
         return {"status": "error", "message": "Nothing to update."}
 
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
 
     # If updating parent, validate
     if new_parent_id is not None:
         if new_parent_id == category_id:
-            conn.close()
             return {"status": "error", "message": "Category cannot be its own parent."}
         cursor.execute("SELECT id FROM categories WHERE id = ?", (new_parent_id,))
         if cursor.fetchone() is None:
-            conn.close()
             return {"status": "error", "message": "Parent category not found."}
-        # Basic cycle prevention: ensure new parent isn't a descendant of this category
-        def _is_descendant(cur, ancestor_id, possible_descendant_id):
-            cur.execute("SELECT id FROM categories WHERE parent_id = ?", (ancestor_id,))
-            children = [r[0] for r in cur.fetchall()]
-            if not children:
-                return False
-            if possible_descendant_id in children:
-                return True
-            for ch in children:
-                if _is_descendant(cur, ch, possible_descendant_id):
-                    return True
-            return False
-        if _is_descendant(cursor, category_id, new_parent_id):
-            conn.close()
+        # Cycle prevention: the new parent must not sit inside this category's subtree
+        if is_descendant(new_parent_id, category_id):
             return {"status": "error", "message": "Cannot set a descendant as parent (cycle)."}
 
     sets = []
@@ -128,16 +174,21 @@ def update_category(category_id, new_name=None, new_parent_id=None):
         params.append(new_parent_id)
     params.append(category_id)
 
-    cursor.execute(f"UPDATE categories SET {', '.join(sets)} WHERE id = ?", tuple(params))
-    conn.commit()
+    try:
+        with conn:
+            cursor.execute(f"UPDATE categories SET {', '.join(sets)} WHERE id = ?", tuple(params))
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Category already exists."}
     updated = cursor.rowcount > 0
-    conn.close()
+    if updated:
+        _changed("categories")
     return {"status": "success" if updated else "error", "updated": updated}
 
 
+@_metrics.timed
 def delete_category(category_id):
     """Delete a category only if it has no products and no subcategories."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
 
     cursor.execute("SELECT COUNT(*) FROM products WHERE category_id = ?", (category_id,))
@@ -147,50 +198,186 @@ def delete_category(category_id):
     child_count = cursor.fetchone()[0]
 
     if product_count > 0:
-        conn.close()
         return {"status": "error", "message": "Category has existing products."}
     if child_count > 0:
-        conn.close()
         return {"status": "error", "message": "Category has subcategories."}
 
-    cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
     deleted = cursor.rowcount > 0
-    conn.close()
+    if deleted:
+        _changed("categories")
     return {"status": "success" if deleted else "error", "deleted": deleted}
 
+# Subtree operations
+# Each runs as a few set-based statements in one transaction, whatever the
+# subtree size; the closure, rollup and search triggers follow along.
+
+_SUBTREE = "(SELECT descendant FROM category_closure WHERE ancestor = ?)"
+
+
+def _category_exists(cursor, category_id):
+    return cursor.execute("SELECT 1 FROM categories WHERE id = ?", (category_id,)).fetchone() is not None
+
+
+@_metrics.timed
+def move_subtree(category_id, new_parent_id=None):
+    """Move a category, with everything below it, under new_parent_id
+    (None makes it a root)."""
+    conn = _connect()
+    cursor = conn.cursor()
+    if not _category_exists(cursor, category_id):
+        return {"status": "error", "message": "Category not found."}
+    if new_parent_id is not None:
+        if not _category_exists(cursor, new_parent_id):
+            return {"status": "error", "message": "Parent category not found."}
+        if new_parent_id == category_id or is_descendant(new_parent_id, category_id):
+            return {"status": "error", "message": "Cannot move a category into its own subtree (cycle)."}
+    with conn:
+        cursor.execute("UPDATE categories SET parent_id = ? WHERE id = ? AND parent_id IS NOT ?",
+                       (new_parent_id, category_id, new_parent_id))
+    if cursor.rowcount:
+        _changed("categories")
+    return {"status": "success", "moved": cursor.rowcount > 0}
+
+
+@_metrics.timed
+def edit_category(category_id, new_name, new_parent_id=None):
+    """Rename a category and move it, with everything below it, under
+    new_parent_id (None makes it a root), in one transaction: if either
+    change fails, neither is applied."""
+    conn = _connect()
+    cursor = conn.cursor()
+    if not _category_exists(cursor, category_id):
+        return {"status": "error", "message": "Category not found."}
+    if new_parent_id is not None:
+        if not _category_exists(cursor, new_parent_id):
+            return {"status": "error", "message": "Parent category not found."}
+        if new_parent_id == category_id or is_descendant(new_parent_id, category_id):
+            return {"status": "error", "message": "Cannot move a category into its own subtree (cycle)."}
+    try:
+        with conn:
+            cursor.execute("UPDATE categories SET name = ? WHERE id = ?", (new_name, category_id))
+            cursor.execute("UPDATE categories SET parent_id = ? WHERE id = ? AND parent_id IS NOT ?",
+                           (new_parent_id, category_id, new_parent_id))
+            moved = cursor.rowcount > 0
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Category already exists."}
+    _changed("categories")
+    return {"status": "success", "updated": True, "moved": moved}
+
+
+@_metrics.timed
+def delete_subtree(category_id, reassign_to=None):
+    """Delete a category and every category below it.
+    Their products are deleted too, or moved to reassign_to when given
+    (which must lie outside the subtree)."""
+    conn = _connect()
+    cursor = conn.cursor()
+    if not _category_exists(cursor, category_id):
+        return {"status": "error", "message": "Category not found."}
+    if reassign_to is not None:
+        if not _category_exists(cursor, reassign_to):
+            return {"status": "error", "message": "Target category not found."}
+        if reassign_to == category_id or is_descendant(reassign_to, category_id):
+            return {"status": "error", "message": "Cannot reassign products to a category being deleted."}
+    with conn:
+        if reassign_to is None:
+            cursor.execute(f"DELETE FROM products WHERE category_id IN {_SUBTREE}", (category_id,))
+        else:
+            cursor.execute(f"UPDATE products SET category_id = ? WHERE category_id IN {_SUBTREE}",
+                           (reassign_to, category_id))
+        products = cursor.rowcount
+        # The subtree list is read in full before the first delete trigger
+        # removes any closure rows
+        cursor.execute(f"DELETE FROM categories WHERE id IN {_SUBTREE}", (category_id,))
+        categories = cursor.rowcount
+    _changed("categories", "products")
+    result = {"status": "success", "deleted_categories": categories}
+    result["reassigned_products" if reassign_to is not None else "deleted_products"] = products
+    return result
+
+
+@_metrics.timed
+def merge_categories(source_id, target_id):
+    """Merge source into target: source's products and subcategories move
+    to target, then source is deleted. target must not lie below source."""
+    conn = _connect()
+    cursor = conn.cursor()
+    if source_id == target_id:
+        return {"status": "error", "message": "Cannot merge a category into itself."}
+    if not _category_exists(cursor, source_id) or not _category_exists(cursor, target_id):
+        return {"status": "error", "message": "Category not found."}
+    if is_descendant(target_id, source_id):
+        return {"status": "error", "message": "Cannot merge a category into its own subtree (cycle)."}
+    with conn:
+        cursor.execute("UPDATE products SET category_id = ? WHERE category_id = ?", (target_id, source_id))
+        products = cursor.rowcount
+        cursor.execute("UPDATE categories SET parent_id = ? WHERE parent_id = ?", (target_id, source_id))
+        children = cursor.rowcount
+        cursor.execute("DELETE FROM categories WHERE id = ?", (source_id,))
+    _changed("categories", "products")
+    return {"status": "success", "moved_products": products, "moved_categories": children}
+
 # Tree helpers
 
+@_metrics.timed
 def get_subcategories(parent_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, parent_id FROM categories WHERE parent_id = ?", (parent_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [Category(id=r[0], name=r[1], parent_id=r[2]).to_dict() for r in rows]
+    cursor = _connect().execute("SELECT id, name, parent_id FROM categories WHERE parent_id = ?", (parent_id,))
+    return [_category_row_to_dict(cursor, r) for r in cursor.fetchall()]
 
 
+@_metrics.timed
+def get_child_categories(parent_id=None):
+    """Return the categories directly under parent_id (the roots when None),
+    each flagged with whether it has subcategories and/or products and
+    carrying its subtree rollups (see get_category_stats). Used to build the
+    tree one level at a time; every lookup is indexed."""
+    cursor = _connect().execute(
+        """
+        SELECT c.id, c.name, c.parent_id,
+               EXISTS (SELECT 1 FROM categories k WHERE k.parent_id = c.id),
+               s.direct_count > 0,
+               s.subtree_count, s.subtree_sum, s.subtree_min, s.subtree_max
+        FROM categories c
+        LEFT JOIN category_stats s ON s.category_id = c.id
+        WHERE c.parent_id IS ?
+        ORDER BY c.name
+        """,
+        (parent_id,),
+    )
+    return [
+        {
+            "id": r[0], "name": r[1], "parent_id": r[2],
+            "has_children": bool(r[3]), "has_products": bool(r[4]),
+            "subtree_count": r[5] or 0,
+            "subtree_avg": r[6] / r[5] if r[5] else None,
+            "subtree_min": r[7],
+            "subtree_max": r[8],
+        }
+        for r in cursor.fetchall()
+    ]
+
+
+@_metrics.timed
 def get_parent_category(category_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT c2.id, c2.name, c2.parent_id FROM categories c1 LEFT JOIN categories c2 ON c1.parent_id = c2.id WHERE c1.id = ?", (category_id,))
+    cursor = _connect().execute("SELECT c2.id, c2.name, c2.parent_id FROM categories c1 LEFT JOIN categories c2 ON c1.parent_id = c2.id WHERE c1.id = ?", (category_id,))
     row = cursor.fetchone()
-    conn.close()
     if row is None or row[0] is None:
         return None
-    return Category(id=row[0], name=row[1], parent_id=row[2]).to_dict()
+    return _category_row_to_dict(cursor, row)
 
 
+@_metrics.timed
 def get_category_hierarchy():
     """Return the entire category hierarchy as a nested structure.
-    Each node: {id, name, parent_id, children: [...]}"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, parent_id FROM categories")
-    rows = cursor.fetchall()
-    conn.close()
+    Each node: {id, name, parent_id, children: [...]}
+    The tree is cached between writes; don't modify it."""
+    return _cached("hierarchy", ("categories",), _build_category_hierarchy)
 
-    nodes = {r[0]: {"id": r[0], "name": r[1], "parent_id": r[2], "children": []} for r in rows}
+
+def _build_category_hierarchy():
+    nodes = {c["id"]: {**c, "children": []} for c in get_all_categories()}
     roots = []
     for nid, node in nodes.items():
         pid = node["parent_id"]
@@ -200,75 +387,970 @@ def get_category_hierarchy():
             roots.append(node)
     return roots
 
+
+@_metrics.timed
+def is_descendant(category_id, ancestor_id):
+    """Return True if category_id lies strictly below ancestor_id."""
+    row = _connect().execute(
+        "SELECT 1 FROM category_closure WHERE ancestor = ? AND descendant = ? AND depth > 0",
+        (ancestor_id, category_id),
+    ).fetchone()
+    return row is not None
+
+
+@_metrics.timed
+def get_subtree_ids(category_id):
+    """Return the ids of category_id and every category below it."""
+    cursor = _connect().execute("SELECT descendant FROM category_closure WHERE ancestor = ?", (category_id,))
+    return [r[0] for r in cursor.fetchall()]
+
+
+@_metrics.timed
+def get_descendants(category_id, max_depth=None):
+    """Return every category below category_id, parents before children.
+    Each item also carries its depth relative to category_id (children = 1).
+    max_depth limits how many levels are returned."""
+    cursor = _connect().execute(
+        """
+        WITH RECURSIVE sub(id, name, parent_id, depth) AS (
+            SELECT id, name, parent_id, 1 FROM categories WHERE parent_id = ?
+            UNION ALL
+            SELECT c.id, c.name, c.parent_id, sub.depth + 1
+            FROM categories c JOIN sub ON c.parent_id = sub.id
+            WHERE ? IS NULL OR sub.depth < ?
+        )
+        SELECT id, name, parent_id, depth FROM sub
+        """,
+        (category_id, max_depth, max_depth),
+    )
+    return [{"id": r[0], "name": r[1], "parent_id": r[2], "depth": r[3]} for r in cursor.fetchall()]
+
+
+@_metrics.timed
+def get_ancestors(category_id):
+    """Return the categories above category_id, starting from the root."""
+    cursor = _connect().execute(
+        """
+        WITH RECURSIVE up(id, name, parent_id, depth) AS (
+            SELECT p.id, p.name, p.parent_id, 1
+            FROM categories c JOIN categories p ON c.parent_id = p.id
+            WHERE c.id = ?
+            UNION ALL
+            SELECT p.id, p.name, p.parent_id, up.depth + 1
+            FROM categories p JOIN up ON up.parent_id = p.id
+        )
+        SELECT id, name, parent_id FROM up ORDER BY depth DESC
+        """,
+        (category_id,),
+    )
+    return [_category_row_to_dict(cursor, r) for r in cursor.fetchall()]
+
+
+@_metrics.timed
+def get_category_path(category_id, separator=" > "):
+    """Return the breadcrumb for a category, e.g. "Electronics > Phones > Android".
+    Returns None if the category doesn't exist."""
+    row = _connect().execute(
+        """
+        WITH RECURSIVE up(parent_id, path) AS (
+            SELECT parent_id, name FROM categories WHERE id = ?
+            UNION ALL
+            SELECT p.parent_id, p.name || ? || up.path
+            FROM categories p JOIN up ON up.parent_id = p.id
+        )
+        SELECT path FROM up WHERE parent_id IS NULL
+        """,
+        (category_id, separator),
+    ).fetchone()
+    return row[0] if row else None
+
+
+@_metrics.timed
+def rebuild_category_closure():
+    """Recompute the hierarchy index and the category rollups from the base
+    tables, e.g. after manual edits to the file."""
+    conn = _connect()
+    with conn:
+        _rebuild_category_closure(conn)
+        _rebuild_category_stats(conn)
+    _changed("categories")
+    return {"status": "success"}
+
+
+@_metrics.timed
+def get_category_stats(category_id):
+    """Return product rollups for one category, or None if it doesn't exist.
+    "direct_*" cover products filed under the category itself, "subtree_*"
+    also those in every subcategory. Each has count, sum, min, avg and max
+    price (min/avg/max are None when the count is 0). The figures are kept
+    current by triggers, so this is a single primary-key lookup."""
+    row = _connect().execute(
+        """
+        SELECT direct_count, direct_sum, direct_min, direct_max,
+               subtree_count, subtree_sum, subtree_min, subtree_max
+        FROM category_stats WHERE category_id = ?
+        """,
+        (category_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    stats = {"category_id": category_id}
+    for prefix, (count, total, low, high) in (("direct", row[:4]), ("subtree", row[4:])):
+        stats[f"{prefix}_count"] = count
+        stats[f"{prefix}_sum"] = total
+        stats[f"{prefix}_min"] = low
+        stats[f"{prefix}_avg"] = total / count if count else None
+        stats[f"{prefix}_max"] = high
+    return stats
+
 # PRODUCT
 
+@_metrics.timed
 def add_product(name, price, category_id):
     """Insert a new product."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO products (name, price, category_id) VALUES (?, ?, ?)",
-        (name, price, category_id)
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO products (name, price, category_id) VALUES (?, ?, ?)",
+                (name, price, category_id)
+            )
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Category not found."}
+    _changed("products")
+    return {"status": "success", "product_id": cursor.lastrowid}
+
+
+# Full "A > B > C" path for every category, built top-down in one pass.
+_CATEGORY_PATHS_CTE = """
+    WITH RECURSIVE category_paths(id, path) AS (
+        SELECT id, name FROM categories WHERE parent_id IS NULL
+        UNION ALL
+        SELECT c.id, cp.path || ' > ' || c.name
+        FROM categories c JOIN category_paths cp ON c.parent_id = cp.id
     )
-    conn.commit()
-    pid = cursor.lastrowid
-    conn.close()
-    return {"status": "success", "product_id": pid}
+"""
 
 
-def get_all_products():
-    """Retrieve all products with category names."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
+def _product_row_to_dict(row, include_path=False):
+    product = {
+        "id": row[0],
+        "name": row[1],
+        "price": row[2],
+        "category_id": row[3],
+        "category_name": row[4],
+    }
+    if include_path:
+        product["category_path"] = row[5]
+    return product
+
+
+def _product_rows_to_dicts(rows, include_path=False):
+    return [_product_row_to_dict(row, include_path) for row in rows]
+
+
+def _product_cursor(row_type, include_path=False):
+    if include_path:
+        make_dict = lambda cursor, row: _product_row_to_dict(row, True)
+    else:
+        make_dict = lambda cursor, row: _product_row_to_dict(row)
+    return _set_row_type(_connect().cursor(), row_type, Product, make_dict)
+
+
+@_metrics.timed
+def get_all_products(include_path=False, row_type="dict"):
+    """Retrieve all products with category names.
+    include_path=True also adds "category_path" (e.g. "Electronics > Phones").
+    row_type: "dict", "model" (Product objects) or "tuple" (id, name, price,
+    category_id, category_name[, category_path]). Tuples are the cheapest
+    to build on big listings, models about as cheap and far smaller than dicts."""
+    if include_path:
+        sql = _CATEGORY_PATHS_CTE + """
+            SELECT p.id, p.name, p.price, p.category_id, c.name, COALESCE(cp.path, c.name)
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN category_paths cp ON cp.id = p.category_id
+        """
+    else:
+        sql = """
+            SELECT p.id, p.name, p.price, p.category_id, c.name
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+        """
+    return _product_cursor(row_type, include_path).execute(sql).fetchall()
+
+
+@_metrics.timed
+def get_product(product_id):
+    """Return one product (with its category name), or None if it doesn't exist."""
+    row = _connect().execute(
         """
         SELECT p.id, p.name, p.price, p.category_id, c.name
         FROM products p
         LEFT JOIN categories c ON p.category_id = c.id
+        WHERE p.id = ?
+        """,
+        (product_id,),
+    ).fetchone()
+    return _product_row_to_dict(row) if row else None
+
+
+@_metrics.timed
+def get_products_by_category(category_id):
+    """Retrieve the products directly in one category."""
+    cursor = _connect().execute(
         """
+        SELECT p.id, p.name, p.price, p.category_id, c.name
+        FROM products p
+        JOIN categories c ON c.id = p.category_id
+        WHERE p.category_id = ?
+        ORDER BY p.name
+        """,
+        (category_id,),
     )
-    rows = cursor.fetchall()
-    conn.close()
+    return _product_rows_to_dicts(cursor.fetchall())
 
-    return [
-        {
-            "id": row[0],
-            "name": row[1],
-            "price": row[2],
-            "category_id": row[3],
-            "category_name": row[4],
-        }
-        for row in rows
-    ]
 
-
-def update_product(product_id, new_name, new_price, new_category_id):
-    """Update product details."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
+@_metrics.timed
+def get_products_in_subtree(category_id):
+    """Retrieve the products of category_id and all of its subcategories."""
+    cursor = _connect().execute(
         """
-        UPDATE products
-        SET name = ?, price = ?, category_id = ?
-        WHERE id = ?
+        WITH RECURSIVE sub(id) AS (
+            SELECT id FROM categories WHERE id = ?
+            UNION ALL
+            SELECT c.id FROM categories c JOIN sub ON c.parent_id = sub.id
+        )
+        SELECT p.id, p.name, p.price, p.category_id, c.name
+        FROM sub
+        JOIN products p ON p.category_id = sub.id
+        JOIN categories c ON c.id = p.category_id
+        """,
+        (category_id,),
+    )
+    return _product_rows_to_dicts(cursor.fetchall())
+
+
+# Sort keys for get_products_page. Each is paired with p.id so the key is unique.
+# All but "category" are read in order from an index; the category name lives
+# in the joined table, so that sort runs over every product for each page.
+PRODUCT_SORT_COLUMNS = {
+    "id": "p.id",
+    "name": "p.name",
+    "price": "p.price",
+    "category": "COALESCE(c.name, '')",
+}
+
+
+@_metrics.timed
+def get_products_page(after_key=None, limit=100, order_by="id", descending=False):
+    """Return one page of products using keyset pagination.
+    order_by: one of PRODUCT_SORT_COLUMNS. after_key is the "next_key" of the
+    previous page (None for the first page). Unlike OFFSET, each page costs
+    the same no matter how deep into the listing it is: an index seek for
+    "id", "name" and "price". "category" sorts on the joined category name,
+    which no index covers, so each of its pages is O(n) in the product count.
+    Returns {"products": [...], "next_key": key or None when exhausted}."""
+    if order_by not in PRODUCT_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {order_by}")
+    column = PRODUCT_SORT_COLUMNS[order_by]
+    direction = "DESC" if descending else "ASC"
+    params = []
+    where = ""
+    if after_key is not None:
+        op = "<" if descending else ">"
+        if order_by == "id":
+            where = f"WHERE p.id {op} ?"
+            params.append(after_key[-1])
+        else:
+            where = f"WHERE ({column}, p.id) {op} (?, ?)"
+            params.extend(after_key)
+    order = f"p.id {direction}" if order_by == "id" else f"{column} {direction}, p.id {direction}"
+    params.append(limit)
+
+    cursor = _connect().execute(
+        f"""
+        SELECT p.id, p.name, p.price, p.category_id, c.name, {column}
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+        {where}
+        ORDER BY {order}
+        LIMIT ?
         """,
-        (new_name, new_price, new_category_id, product_id),
+        tuple(params),
     )
-    conn.commit()
+    rows = cursor.fetchall()
+    next_key = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_key = (last[0],) if order_by == "id" else (last[5], last[0])
+    return {"products": _product_rows_to_dicts(rows), "next_key": next_key}
+
+
+@_metrics.timed
+def update_product(product_id, new_name, new_price, new_category_id):
+    """Update product details."""
+    conn = _connect()
+    try:
+        with conn:
+            cursor = conn.execute(
+                """
+                UPDATE products
+                SET name = ?, price = ?, category_id = ?
+                WHERE id = ?
+                """,
+                (new_name, new_price, new_category_id, product_id),
+            )
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Category not found."}
     updated = cursor.rowcount > 0
-    conn.close()
+    if updated:
+        _changed("products")
     return {"status": "success" if updated else "error", "updated": updated}
 
 
+@_metrics.timed
 def delete_product(product_id):
     """Delete a product by ID."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-    conn.commit()
+    conn = _connect()
+    with conn:
+        cursor = conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
     deleted = cursor.rowcount > 0
-    conn.close()
+    if deleted:
+        _changed("products")
     return {"status": "success" if deleted else "error", "deleted": deleted}
 
+# SEARCH
+
+_SEARCH_TOKEN = re.compile(r"\w+")
+SEARCH_CANDIDATES = 2000
+SEARCH_SHORT_PREFIX = 3     # queries whose words are all shorter than this get the candidate cap
+
+# Breadcrumb for category c, read from the closure table root-first
+_CATEGORY_PATH_SUBQUERY = """
+    (SELECT group_concat(name, ' > ') FROM (
+        SELECT a.name FROM category_closure cc JOIN categories a ON a.id = cc.ancestor
+        WHERE cc.descendant = c.id ORDER BY cc.depth DESC))
+"""
+
+
+def _search_terms(query):
+    return _SEARCH_TOKEN.findall(query or "")
+
+
+def _like_clauses(column, terms):
+    escaped = [t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for t in terms]
+    return " AND ".join(f"{column} LIKE ? ESCAPE '\\'" for _ in terms), [f"%{t}%" for t in escaped]
+
+
+@_metrics.timed
+def search_products(query, limit=50, category_subtree=None):
+    """Full-text search on product names, best matches first.
+    Every word must match, each as a prefix, so "gal pho" finds
+    "Galaxy Phone". category_subtree limits results to a category and
+    everything below it."""
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    conn = _connect()
+    in_subtree = "IN (SELECT descendant FROM category_closure WHERE ancestor = ?)"
+    params = []
+
+    if has_fts(conn):
+        # While every word is a short prefix, rank only the first
+        # SEARCH_CANDIDATES matches (in rowid order, so not necessarily the
+        # best): bm25 over every hit of a one- or two-letter prefix is what
+        # makes type-ahead slow on big catalogs. Longer queries rank every
+        # match, however many there are, and keep the best.
+        if max(map(len, terms)) < SEARCH_SHORT_PREFIX:
+            shortlist = f"LIMIT {SEARCH_CANDIDATES}"
+        else:
+            shortlist = "ORDER BY products_fts.rank LIMIT ?"
+        if category_subtree is None:
+            candidates = "FROM products_fts WHERE products_fts MATCH ?"
+        else:
+            candidates = f"""
+                FROM products_fts JOIN products sp ON sp.id = products_fts.rowid
+                WHERE sp.category_id {in_subtree} AND products_fts MATCH ?
+            """
+            params.append(category_subtree)
+        params.append(" ".join(f'"{t}"*' for t in terms))
+        if shortlist.endswith("?"):
+            params.append(limit)
+        sql = f"""
+            SELECT p.id, p.name, p.price, p.category_id, c.name
+            FROM (
+                SELECT products_fts.rowid AS id, products_fts.rank AS score
+                {candidates}
+                {shortlist}
+            ) m
+            JOIN products p ON p.id = m.id
+            LEFT JOIN categories c ON c.id = p.category_id
+            ORDER BY m.score
+            LIMIT ?
+        """
+    else:
+        where, params = _like_clauses("p.name", terms)
+        if category_subtree is not None:
+            where += f" AND p.category_id {in_subtree}"
+            params.append(category_subtree)
+        sql = f"""
+            SELECT p.id, p.name, p.price, p.category_id, c.name
+            FROM products p
+            LEFT JOIN categories c ON c.id = p.category_id
+            WHERE {where}
+            ORDER BY p.name
+            LIMIT ?
+        """
+    params.append(limit)
+    return _product_rows_to_dicts(conn.execute(sql, tuple(params)).fetchall())
+
+
+@_metrics.timed
+def search_categories(query, limit=50):
+    """Full-text search on category names, best matches first.
+    Each result also carries its full "path"."""
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    conn = _connect()
+    if has_fts(conn):
+        sql = f"""
+            SELECT c.id, c.name, c.parent_id, {_CATEGORY_PATH_SUBQUERY}
+            FROM categories_fts
+            JOIN categories c ON c.id = categories_fts.rowid
+            WHERE categories_fts MATCH ?
+            ORDER BY categories_fts.rank
+            LIMIT ?
+        """
+        params = (" ".join(f'"{t}"*' for t in terms), limit)
+    else:
+        where, like_params = _like_clauses("c.name", terms)
+        sql = f"""
+            SELECT c.id, c.name, c.parent_id, {_CATEGORY_PATH_SUBQUERY}
+            FROM categories c
+            WHERE {where}
+            ORDER BY c.name
+            LIMIT ?
+        """
+        params = (*like_params, limit)
+    rows = conn.execute(sql, params).fetchall()
+    return [{"id": r[0], "name": r[1], "parent_id": r[2], "path": r[3]} for r in rows]
+
+# QUERY
+
+# Lower bounds of the price facet buckets; the last one is open-ended
+PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+
+# Sort keys for query_products, over the columns of its filtered set
+QUERY_SORT_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "price": "price",
+    "category": "COALESCE(category_name, '')",
+}
+
+# Facets scan the filtered set several times; MATERIALIZED (SQLite 3.35+)
+# makes sure the filter runs once and the branches read its result.
+_MATERIALIZED = "MATERIALIZED" if sqlite3.sqlite_version_info >= (3, 35, 0) else ""
+
+
+def _price_bucket(column):
+    cases = " ".join(f"WHEN {column} < {upper} THEN {i}" for i, upper in enumerate(PRICE_BUCKETS[1:]))
+    return f"CASE {cases} ELSE {len(PRICE_BUCKETS) - 1} END"
+
+
+@_metrics.timed
+def query_products(category_subtree=None, min_price=None, max_price=None, name=None,
+                   order_by="name", descending=False, limit=100, per_category=None, facets=False):
+    """Filter, sort and cut products in one statement.
+    Every filter is optional: category_subtree keeps a category and everything
+    below it, min_price/max_price bound the price (inclusive) and name must
+    match every word as a prefix, like search_products. order_by is one of
+    QUERY_SORT_COLUMNS. per_category=N keeps only the first N products of each
+    category in that order (e.g. the 5 cheapest), grouped by category.
+    With facets=True the same pass also counts the matches per price bucket
+    (PRICE_BUCKETS) and per child category of category_subtree (root
+    categories when it is None).
+    Returns {"products": [...], "facets": {"total", "price", "categories"} or None}."""
+    if order_by not in QUERY_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {order_by}")
+    conn = _connect()
+    where, params = [], []
+    if category_subtree is not None:
+        where.append("p.category_id IN (SELECT descendant FROM category_closure WHERE ancestor = ?)")
+        params.append(category_subtree)
+    if min_price is not None:
+        where.append("p.price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("p.price <= ?")
+        params.append(max_price)
+    terms = _search_terms(name)
+    if terms:
+        if has_fts(conn):
+            where.append("p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+            params.append(" ".join(f'"{t}"*' for t in terms))
+        else:
+            clause, like_params = _like_clauses("p.name", terms)
+            where.append(clause)
+            params.extend(like_params)
+
+    direction = "DESC" if descending else "ASC"
+    column = QUERY_SORT_COLUMNS[order_by]
+    order = f"id {direction}" if order_by == "id" else f"{column} {direction}, id {direction}"
+    if per_category:
+        source = f"""
+            (SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY category_id ORDER BY {order}) AS category_rank
+                FROM filtered)
+            WHERE category_rank <= ?)
+        """
+        params.append(per_category)
+        order = "COALESCE(category_name, ''), category_id, category_rank"
+    else:
+        source = "filtered"
+    params.append(limit)
+
+    # One result set, told apart by the first column: 0 = product rows in
+    # order (numbered after the LIMIT, so only the kept rows get sorted
+    # twice), 1 = price buckets, 2 = child categories.
+    sql = f"""
+        WITH filtered AS {_MATERIALIZED if facets else ""} (
+            SELECT p.id, p.name, p.price, p.category_id, c.name AS category_name
+            FROM products p
+            LEFT JOIN categories c ON c.id = p.category_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+        )
+        SELECT 0, ROW_NUMBER() OVER (ORDER BY {order}), id, name, price, category_id, category_name, NULL
+        FROM (SELECT * FROM {source} ORDER BY {order} LIMIT ?)
+    """
+    if facets:
+        child_of = "ch.parent_id IS NULL" if category_subtree is None else "ch.parent_id = ?"
+        if category_subtree is not None:
+            params.append(category_subtree)
+        sql += f"""
+        UNION ALL
+        SELECT 1, {_price_bucket("price")} AS bucket, NULL, NULL, NULL, NULL, NULL, COUNT(*)
+        FROM filtered
+        GROUP BY bucket
+        UNION ALL
+        SELECT 2, NULL, ch.id, ch.name, NULL, NULL, NULL, COUNT(*)
+        FROM filtered f
+        JOIN category_closure cc ON cc.descendant = f.category_id
+        JOIN categories ch ON ch.id = cc.ancestor
+        WHERE {child_of}
+        GROUP BY ch.id
+        """
+    sql += " ORDER BY 1, 2, 8 DESC, 4"
+
+    products = []
+    price_counts = [0] * len(PRICE_BUCKETS)
+    categories = []
+    for row in conn.execute(sql, tuple(params)):
+        part = row[0]
+        if part == 0:
+            products.append(_product_row_to_dict(row[2:]))
+        elif part == 1:
+            price_counts[row[1]] = row[7]
+        else:
+            categories.append({"id": row[2], "name": row[3], "count": row[7]})
+
+    result_facets = None
+    if facets:
+        uppers = PRICE_BUCKETS[1:] + (None,)
+        result_facets = {
+            "total": sum(price_counts),
+            "price": [
+                {"min": lower, "max": upper, "count": count}
+                for lower, upper, count in zip(PRICE_BUCKETS, uppers, price_counts)
+            ],
+            "categories": categories,
+        }
+    return {"products": products, "facets": result_facets}
+
+# STREAMING
+
+STREAM_BATCH_SIZE = 1000
+
+
+def _iter_rows(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+@_metrics.timed
+def iter_products(batch_size=STREAM_BATCH_SIZE, include_path=False, row_type="dict"):
+    """Yield products one at a time (same rows as get_all_products), fetching
+    batch_size rows per round-trip so memory stays flat on large catalogs."""
+    if include_path:
+        sql = _CATEGORY_PATHS_CTE + """
+            SELECT p.id, p.name, p.price, p.category_id, c.name, COALESCE(cp.path, c.name)
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN category_paths cp ON cp.id = p.category_id
+            ORDER BY p.id
+        """
+    else:
+        sql = """
+            SELECT p.id, p.name, p.price, p.category_id, c.name
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            ORDER BY p.id
+        """
+    cursor = _product_cursor(row_type, include_path)
+    cursor.execute(sql)
+    yield from _iter_rows(cursor, batch_size)
+
+
+@_metrics.timed
+def iter_categories(batch_size=STREAM_BATCH_SIZE, tree_order=False):
+    """Yield categories one at a time.
+    tree_order=True yields them depth-first (each parent directly followed by
+    its subtree) with an extra "depth" key, which lets callers write nested
+    output without holding the tree in memory."""
+    cursor = _connect().cursor()
+    if not tree_order:
+        cursor.execute("SELECT id, name, parent_id FROM categories ORDER BY id")
+        for r in _iter_rows(cursor, batch_size):
+            yield {"id": r[0], "name": r[1], "parent_id": r[2]}
+        return
+
+    # ORDER BY depth DESC turns the CTE queue into a stack, i.e. depth-first.
+    # Rows whose parent is missing are treated as roots, like get_category_hierarchy.
+    cursor.execute(
+        """
+        WITH RECURSIVE tree(id, name, parent_id, depth) AS (
+            SELECT id, name, parent_id, 0 FROM categories
+            WHERE parent_id IS NULL OR parent_id NOT IN (SELECT id FROM categories)
+            UNION ALL
+            SELECT c.id, c.name, c.parent_id, t.depth + 1
+            FROM categories c JOIN tree t ON c.parent_id = t.id
+            ORDER BY 4 DESC
+        )
+        SELECT id, name, parent_id, depth FROM tree
+        """
+    )
+    for r in _iter_rows(cursor, batch_size):
+        yield {"id": r[0], "name": r[1], "parent_id": r[2], "depth": r[3]}
+
+
+@_metrics.timed
+def iter_product_prices(batch_size=STREAM_BATCH_SIZE):
+    """Yield (price, category_id) for every product as plain tuples, with 0
+    for uncategorized ones, ordered by category and then price. Only the two
+    columns numeric reports need, read off the (category_id, price) index in
+    its own order, so the ordering costs no sort."""
+    cursor = _connect().execute(
+        "SELECT price, COALESCE(category_id, 0) FROM products ORDER BY category_id, price"
+    )
+    yield from _iter_rows(cursor, batch_size)
+
+# BULK
+
+BULK_CHUNK_SIZE = 1000
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@_metrics.timed
+def add_products_bulk(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Insert many products, one transaction per chunk of rows.
+    rows: iterable of dicts with "name", "price" and either "category_id" or
+    "category" (a category name). Invalid rows are skipped and reported in
+    "errors" as {"row": <1-based position>, "message": ...}."""
+    conn = _connect()
+    cursor = conn.cursor()
+    name_to_id = dict(get_category_id_map())
+    known_ids = set(name_to_id.values())
+    inserted = 0
+    errors = []
+
+    def _prepare(row):
+        name = row.get("name")
+        if not isinstance(name, str) or not is_not_empty(name):
+            return None, "Product name is empty."
+        if not is_valid_price(row.get("price")):
+            return None, f"Invalid price: {row.get('price')!r}."
+        category_id = row.get("category_id")
+        category_name = row.get("category")
+        if category_id not in (None, ""):
+            try:
+                category_id = int(category_id)
+            except (TypeError, ValueError):
+                category_id = -1
+            if category_id not in known_ids:
+                return None, f"Category id {row.get('category_id')!r} not found."
+        elif category_name not in (None, ""):
+            category_id = name_to_id.get(category_name)
+            if category_id is None:
+                return None, f"Category '{category_name}' not found."
+        else:
+            category_id = None
+        return (name.strip(), float(row["price"]), category_id), None
+
+    position = 0
+    for chunk in _chunks(rows, chunk_size):
+        batch = []
+        for row in chunk:
+            position += 1
+            values, message = _prepare(row)
+            if message:
+                errors.append({"row": position, "message": message})
+            else:
+                batch.append(values)
+        if batch:
+            with conn:
+                cursor.executemany("INSERT INTO products (name, price, category_id) VALUES (?, ?, ?)", batch)
+            inserted += len(batch)
+            _changed("products")
+    compact_change_log()
+
+    return {"status": "success" if not errors else "error", "inserted": inserted, "errors": errors}
+
+
+@_metrics.timed
+def add_categories_bulk(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Insert many categories, one transaction per chunk of rows.
+    rows: iterable of dicts with "name" and optionally "parent_id" or
+    "parent" (a category name). A parent may be created earlier in the same
+    load. Invalid rows are reported in "errors" like add_products_bulk."""
+    conn = _connect()
+    cursor = conn.cursor()
+    name_to_id = dict(get_category_id_map())
+    known_ids = set(name_to_id.values())
+    inserted = 0
+    errors = []
+    # (name, parent_id, parent name) rows not yet inserted. A parent given by
+    # name is looked up as each row is inserted, so it may come earlier in
+    # the same chunk.
+    pending = []
+    pending_names = set()
+
+    def _flush():
+        nonlocal inserted
+        if not pending:
+            return
+        with conn:
+            cursor.executemany(
+                "INSERT INTO categories (name, parent_id) VALUES (?, COALESCE(?, (SELECT id FROM categories WHERE name = ?)))",
+                pending,
+            )
+        _changed("categories")
+        names = [row[0] for row in pending]
+        placeholders = ", ".join("?" * len(names))
+        cursor.execute(f"SELECT name, id FROM categories WHERE name IN ({placeholders})", names)
+        for n, cid in cursor.fetchall():
+            name_to_id[n] = cid
+            known_ids.add(cid)
+        inserted += len(pending)
+        pending.clear()
+        pending_names.clear()
+
+    position = 0
+    for row in rows:
+        position += 1
+        name = row.get("name")
+        if not isinstance(name, str) or not is_not_empty(name):
+            errors.append({"row": position, "message": "Category name is empty."})
+            continue
+        name = name.strip()
+        if name in name_to_id or name in pending_names:
+            errors.append({"row": position, "message": f"Category '{name}' already exists."})
+            continue
+
+        parent = parent_ref = None
+        parent_id = row.get("parent_id")
+        parent_name = row.get("parent")
+        if parent_id not in (None, ""):
+            try:
+                parent = int(parent_id)
+            except (TypeError, ValueError):
+                parent = -1
+            if parent not in known_ids:
+                errors.append({"row": position, "message": f"Parent category id {parent_id!r} not found."})
+                continue
+        elif parent_name not in (None, ""):
+            if parent_name not in name_to_id and parent_name not in pending_names:
+                errors.append({"row": position, "message": f"Parent category '{parent_name}' not found."})
+                continue
+            parent_ref = parent_name
+
+        pending.append((name, parent, parent_ref))
+        pending_names.add(name)
+        if len(pending) >= chunk_size:
+            _flush()
+    _flush()
+    compact_change_log()
+
+    return {"status": "success" if not errors else "error", "inserted": inserted, "errors": errors}
+
+# SYNC
+# Set-based writers for data.sync, which works out what differs between a
+# catalog snapshot and the database. Categories are addressed by name, the
+# key snapshots use; each call applies its whole batch in one transaction.
+
+
+@_metrics.timed
+def insert_missing_categories(names):
+    """Create the named categories that don't exist yet, as top-level ones."""
+    conn = _connect()
+    with conn:
+        cursor = conn.executemany(
+            "INSERT INTO categories (name) VALUES (?) ON CONFLICT(name) DO NOTHING",
+            [(name,) for name in names],
+        )
+    if cursor.rowcount > 0:
+        _changed("categories")
+    return {"status": "success", "inserted": max(cursor.rowcount, 0)}
+
+
+@_metrics.timed
+def set_category_parents(moves):
+    """Move categories: moves is (name, parent name or None) pairs. The
+    caller keeps the tree acyclic, e.g. by detaching everything it moves
+    before attaching any of it."""
+    conn = _connect()
+    with conn:
+        cursor = conn.executemany(
+            "UPDATE categories SET parent_id = (SELECT id FROM categories WHERE name = ?) WHERE name = ?",
+            [(parent, name) for name, parent in moves],
+        )
+    if cursor.rowcount > 0:
+        _changed("categories")
+    return {"status": "success", "moved": max(cursor.rowcount, 0)}
+
+
+@_metrics.timed
+def delete_categories_by_name(names):
+    """Delete the named categories, which must not have children left.
+    Their products become uncategorized."""
+    conn = _connect()
+    rows = [(name,) for name in names]
+    try:
+        with conn:
+            uncategorized = conn.executemany(
+                "UPDATE products SET category_id = NULL WHERE category_id = (SELECT id FROM categories WHERE name = ?)",
+                rows,
+            ).rowcount
+            deleted = conn.executemany("DELETE FROM categories WHERE name = ?", rows).rowcount
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Cannot delete categories that still have subcategories."}
+    _changed("categories", "products")
+    return {"status": "success", "deleted": max(deleted, 0), "uncategorized": max(uncategorized, 0)}
+
+
+@_metrics.timed
+def upsert_products(rows):
+    """Insert or update products: rows is (id or None, name, price, category
+    name or None). A None id inserts a new product; otherwise the product
+    with that id gets the price and category."""
+    conn = _connect()
+    with conn:
+        cursor = conn.executemany(
+            """
+            INSERT INTO products (id, name, price, category_id)
+            VALUES (?, ?, ?, (SELECT id FROM categories WHERE name = ?))
+            ON CONFLICT(id) DO UPDATE SET price = excluded.price, category_id = excluded.category_id
+            """,
+            rows,
+        )
+    if cursor.rowcount > 0:
+        _changed("products")
+    return {"status": "success", "written": max(cursor.rowcount, 0)}
+
+
+@_metrics.timed
+def delete_products(product_ids):
+    """Delete the products with the given ids."""
+    conn = _connect()
+    with conn:
+        cursor = conn.executemany("DELETE FROM products WHERE id = ?", [(i,) for i in product_ids])
+    if cursor.rowcount > 0:
+        _changed("products")
+    return {"status": "success", "deleted": max(cursor.rowcount, 0)}
+
+# CHANGE LOG
+# Triggers append an entry to change_log for every insert, update and delete
+# on categories and products. A reader remembers the last seq it applied and
+# asks for what came after it instead of re-reading the tables.
+
+CHANGE_LOG_MAX_ROWS = 100_000
+# Besides startup, bulk loads and syncs, compaction runs once every this many
+# committed writes, so processes that stay up (the API server, the GUI) don't
+# let the log grow until they restart.
+CHANGE_LOG_COMPACT_INTERVAL = 1000
+_write_count = itertools.count(1)
+
+
+@_metrics.timed
+def get_change_seq():
+    """Return the seq of the newest logged change (0 if there is none yet).
+    Read it before a full load to know where to continue from afterwards."""
+    row = _connect().execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+@_metrics.timed
+def get_changes_since(seq, limit=1000):
+    """Return up to limit changes logged after seq, oldest first, as
+    {"changes": [...], "last_seq": seq to pass next time, "reset": bool}.
+    Each change is {"seq", "table", "op", "id", "data"}: op is "insert",
+    "update" or "delete" and data the row as it is after the change (None
+    for deletes). Compaction may fold several changes to one row into its
+    latest, so apply each as an upsert or delete by id.
+    "reset" means changes after seq were compacted away: reload everything,
+    then continue from last_seq."""
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT seq, table_name, op, row_id, data FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+        (seq, limit),
+    ).fetchall()
+    # Read after the entries: a compaction that ran before them shows up here
+    truncated_through = conn.execute("SELECT truncated_through FROM change_log_state").fetchone()[0]
+    if seq < truncated_through:
+        return {"changes": [], "last_seq": get_change_seq(), "reset": True}
+    changes = [
+        {"seq": r[0], "table": r[1], "op": r[2], "id": r[3], "data": json.loads(r[4]) if r[4] else None}
+        for r in rows
+    ]
+    return {"changes": changes, "last_seq": changes[-1]["seq"] if changes else seq, "reset": False}
 
 
+@_metrics.timed
+def compact_change_log(max_rows=None):
+    """Keep the change log to at most max_rows (default CHANGE_LOG_MAX_ROWS)
+    entries. Does nothing while it
+    is within the bound; otherwise first drops entries superseded by a later
+    change to the same row, then the oldest entries left over the bound
+    (readers behind those get "reset" from get_changes_since)."""
+    if max_rows is None:
+        max_rows = CHANGE_LOG_MAX_ROWS
+    conn = _connect()
+    if conn.execute("SELECT 1 FROM change_log ORDER BY seq DESC LIMIT 1 OFFSET ?", (max_rows,)).fetchone() is None:
+        return {"status": "success", "collapsed": 0, "truncated": 0}
+    with conn:
+        collapsed = conn.execute(
+            """
+            DELETE FROM change_log
+            WHERE seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY table_name, row_id)
+            """
+        ).rowcount
+        truncated = 0
+        row = conn.execute("SELECT seq FROM change_log ORDER BY seq DESC LIMIT 1 OFFSET ?", (max_rows,)).fetchone()
+        if row is not None:
+            truncated = conn.execute("DELETE FROM change_log WHERE seq <= ?", (row[0],)).rowcount
+            conn.execute("UPDATE change_log_state SET truncated_through = MAX(truncated_through, ?)", (row[0],))
+    return {"status": "success", "collapsed": collapsed, "truncated": truncated}
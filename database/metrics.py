@@ -0,0 +1,215 @@
+"""Opt-in timing and slow-query instrumentation for db_manager.
+
+Nothing is recorded until enable() is called. While disabled, a decorated
+function costs one extra call and a flag check, and no trace callback is
+installed on connections that haven't been used while enabled.
+
+Once enabled, every call to a function decorated with timed() records its
+latency and the rows it returned, and the connections it uses get a trace
+callback that captures the SQL each call runs. Calls slower than the
+threshold land in the slow-query log together with that SQL.
+
+    from database import metrics
+    metrics.enable(slow_ms=50)
+    ...
+    metrics.dump_metrics("metrics.json")
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+
+SAMPLE_SIZE = 1024      # latencies kept per function for the percentiles
+SLOW_LOG_SIZE = 200
+MAX_STATEMENTS = 50     # SQL statements kept per slow-log entry
+MAX_CAPTURED = 1000     # SQL statements buffered per top-level call
+
+active = False          # read on every call; flipped by enable()/disable()
+
+_lock = threading.Lock()
+_local = threading.local()
+_settings = {"slow_ms": 100.0}
+_functions = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+
+class _FunctionStats:
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "rows", "queries", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.queries = 0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+
+def enable(slow_ms=100.0):
+    """Start recording. Calls taking at least slow_ms go to the slow-query log."""
+    global active
+    _settings["slow_ms"] = slow_ms
+    active = True
+
+
+def disable():
+    """Stop recording. Collected metrics are kept until reset()."""
+    global active
+    active = False
+
+
+def reset():
+    with _lock:
+        _functions.clear()
+        _slow_log.clear()
+
+
+def _trace(sql):
+    if active and _local.__dict__.get("depth"):
+        _local.queries += 1
+        if len(_local.statements) < MAX_CAPTURED:
+            _local.statements.append(sql)
+
+
+def watch(conn):
+    """Install the SQL trace callback on conn, once per connection. Must run
+    on the thread that owns conn. After disable() the callback stays in place
+    but returns immediately."""
+    traced = _local.__dict__.setdefault("traced", {})
+    if traced.get(id(conn)) is not conn:
+        conn.set_trace_callback(_trace)
+        traced[id(conn)] = conn
+
+
+def _count_rows(result):
+    # Lists of rows and get_products_page() pages; status dicts and maps count as 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get("products"), list):
+        return len(result["products"])
+    return 0
+
+
+def _record(name, elapsed_ms, rows, failed, start):
+    first_query, first_statement = start
+    statements = _local.statements
+    queries = _local.queries - first_query
+    slow = elapsed_ms >= _settings["slow_ms"]
+    with _lock:
+        stats = _functions.get(name)
+        if stats is None:
+            stats = _functions[name] = _FunctionStats()
+        stats.calls += 1
+        stats.errors += failed
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.rows += rows
+        stats.queries += queries
+        stats.samples.append(elapsed_ms)
+        if slow:
+            _slow_log.append({
+                "function": name,
+                "duration_ms": round(elapsed_ms, 3),
+                "timestamp": time.time(),
+                "sql": [" ".join(sql.split()) for sql in statements[first_statement:first_statement + MAX_STATEMENTS]],
+            })
+
+
+def _enter():
+    """Start a timed call on this thread; returns where its SQL begins."""
+    if not _local.__dict__.get("depth"):
+        _local.depth = 0
+        _local.queries = 0
+        _local.statements = []
+    _local.depth += 1
+    return _local.queries, len(_local.statements)
+
+
+def _exit():
+    _local.depth -= 1
+
+
+def timed(fn):
+    """Record latency, rows returned and SQL run for each call of fn while
+    metrics are enabled. Generator functions are timed until exhausted."""
+    name = fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not active:
+                return (yield from fn(*args, **kwargs))
+            first = _enter()
+            start = time.perf_counter()
+            rows = 0
+            failed = False
+            try:
+                for item in fn(*args, **kwargs):
+                    rows += 1
+                    yield item
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _record(name, (time.perf_counter() - start) * 1000, rows, failed, first)
+                _exit()
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not active:
+            return fn(*args, **kwargs)
+        first = _enter()
+        start = time.perf_counter()
+        result = None
+        failed = False
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _record(name, (time.perf_counter() - start) * 1000, _count_rows(result), failed, first)
+            _exit()
+    return wrapper
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def get_metrics():
+    """Return a snapshot: per-function call counts, latency percentiles (over
+    the last SAMPLE_SIZE calls), rows and queries, plus the slow-query log."""
+    with _lock:
+        functions = {}
+        for name, stats in _functions.items():
+            samples = sorted(stats.samples)
+            functions[name] = {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "total_ms": round(stats.total_ms, 3),
+                "mean_ms": round(stats.total_ms / stats.calls, 3),
+                "p50_ms": round(_percentile(samples, 0.50), 3),
+                "p95_ms": round(_percentile(samples, 0.95), 3),
+                "p99_ms": round(_percentile(samples, 0.99), 3),
+                "max_ms": round(stats.max_ms, 3),
+                "rows": stats.rows,
+                "queries": stats.queries,
+            }
+        return {
+            "enabled": active,
+            "slow_ms": _settings["slow_ms"],
+            "functions": functions,
+            "slow_queries": list(_slow_log),
+        }
+
+
+def dump_metrics(path):
+    """Write get_metrics() to path as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_metrics(), f, indent=2)
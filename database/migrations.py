@@ -0,0 +1,479 @@
+"""Ordered schema migrations tracked with PRAGMA user_version.
+
+Each step upgrades the schema by one version and must be safe to run against
+a database created by an older release (hence the IF NOT EXISTS checks).
+Append new steps to MIGRATIONS; never reorder or edit released ones.
+"""
+import sqlite3
+
+
+def _column_exists(conn, table, column):
+    cols = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    return column in cols
+
+
+def _create_tables(conn):
+    # Categories support hierarchy via parent_id
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            parent_id INTEGER,
+            FOREIGN KEY (parent_id) REFERENCES categories(id)
+        )
+        """
+    )
+
+    # Databases from before the hierarchy feature lack parent_id
+    if not _column_exists(conn, "categories", "parent_id"):
+        conn.execute("ALTER TABLE categories ADD COLUMN parent_id INTEGER")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            category_id INTEGER,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+        """
+    )
+
+
+def _add_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_categories_parent_id ON categories(parent_id)")
+    # (category_id, price) also answers plain category_id lookups and FK checks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_category_id ON products(category_id, price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)")
+
+
+def rebuild_category_closure(conn):
+    """Recompute category_closure from categories.parent_id.
+
+    The depth guard stops runaway recursion if legacy data contains a cycle.
+    """
+    conn.execute("DELETE FROM category_closure")
+    conn.execute(
+        """
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        WITH RECURSIVE paths(ancestor, descendant, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT p.ancestor, c.id, p.depth + 1
+            FROM paths p
+            JOIN categories c ON c.parent_id = p.descendant
+            WHERE p.depth < (SELECT COUNT(*) FROM categories)
+        )
+        SELECT ancestor, descendant, MIN(depth) FROM paths GROUP BY ancestor, descendant
+        """
+    )
+
+
+def _add_category_closure(conn):
+    # One row per (ancestor, descendant) pair, including each node with itself
+    # at depth 0, so subtree and ancestry questions are single index lookups.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS category_closure (
+            ancestor INTEGER NOT NULL,
+            descendant INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_closure_descendant ON category_closure(descendant, depth)")
+
+    # Triggers keep the closure in step with every write to categories.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_closure_insert
+        AFTER INSERT ON categories
+        BEGIN
+            INSERT INTO category_closure (ancestor, descendant, depth)
+            SELECT ancestor, NEW.id, depth + 1 FROM category_closure WHERE descendant = NEW.parent_id
+            UNION ALL
+            SELECT NEW.id, NEW.id, 0;
+        END
+        """
+    )
+    # Moving a node moves its whole subtree: drop the paths from the old
+    # ancestors into the subtree, then join the new parent's ancestors to it.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_closure_move
+        AFTER UPDATE OF parent_id ON categories
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            DELETE FROM category_closure
+            WHERE descendant IN (SELECT descendant FROM category_closure WHERE ancestor = NEW.id)
+              AND ancestor NOT IN (SELECT descendant FROM category_closure WHERE ancestor = NEW.id);
+            INSERT INTO category_closure (ancestor, descendant, depth)
+            SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+            FROM category_closure a, category_closure d
+            WHERE a.descendant = NEW.parent_id AND d.ancestor = NEW.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_closure_delete
+        AFTER DELETE ON categories
+        BEGIN
+            DELETE FROM category_closure WHERE descendant = OLD.id OR ancestor = OLD.id;
+        END
+        """
+    )
+    rebuild_category_closure(conn)
+
+
+def _fts_triggers(table, fts_table):
+    # External-content FTS tables hold only the index; these triggers mirror
+    # every change to the name column into it.
+    return (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts_table} (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF name ON {table}
+        BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO {fts_table} (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+        """,
+    )
+
+
+def has_fts(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'").fetchone()
+    return row is not None
+
+
+def _add_name_search(conn):
+    # Builds without FTS5 keep working; search falls back to LIKE prefix matching.
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+    except sqlite3.OperationalError:
+        return
+    for table, fts_table in (("products", "products_fts"), ("categories", "categories_fts")):
+        conn.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                name, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            """
+        )
+        for sql in _fts_triggers(table, fts_table):
+            conn.execute(sql)
+        conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+
+def rebuild_category_stats(conn):
+    """Recompute category_stats from products and category_closure."""
+    conn.execute("DELETE FROM category_stats")
+    conn.execute(
+        """
+        INSERT INTO category_stats (
+            category_id, direct_count, direct_sum, direct_min, direct_max,
+            subtree_count, subtree_sum, subtree_min, subtree_max)
+        WITH direct AS (
+            SELECT category_id, COUNT(*) AS n, SUM(price) AS total, MIN(price) AS lo, MAX(price) AS hi
+            FROM products WHERE category_id IS NOT NULL GROUP BY category_id
+        ), subtree AS (
+            SELECT cc.ancestor AS category_id, SUM(d.n) AS n, SUM(d.total) AS total, MIN(d.lo) AS lo, MAX(d.hi) AS hi
+            FROM category_closure cc JOIN direct d ON d.category_id = cc.descendant
+            GROUP BY cc.ancestor
+        )
+        SELECT c.id,
+               COALESCE(d.n, 0), COALESCE(d.total, 0), d.lo, d.hi,
+               COALESCE(s.n, 0), COALESCE(s.total, 0), s.lo, s.hi
+        FROM categories c
+        LEFT JOIN direct d ON d.category_id = c.id
+        LEFT JOIN subtree s ON s.category_id = c.id
+        """
+    )
+
+
+# Statements that take one product price out of the rollups, for the trigger
+# bodies below. Count and sum are adjusted in place. Min/max only need work
+# when the removed price was the extreme: direct values are re-read through
+# idx_products_category_id, subtree values from the descendants' direct ones.
+_STATS_REMOVE_PRODUCT = """
+    UPDATE category_stats SET
+        direct_count = direct_count - 1,
+        direct_sum = CASE WHEN direct_count = 1 THEN 0 ELSE direct_sum - OLD.price END,
+        direct_min = CASE WHEN direct_min < OLD.price THEN direct_min
+                          ELSE (SELECT MIN(price) FROM products WHERE category_id = OLD.category_id) END,
+        direct_max = CASE WHEN direct_max > OLD.price THEN direct_max
+                          ELSE (SELECT MAX(price) FROM products WHERE category_id = OLD.category_id) END
+    WHERE category_id = OLD.category_id;
+    UPDATE category_stats SET
+        subtree_count = subtree_count - 1,
+        subtree_sum = CASE WHEN subtree_count = 1 THEN 0 ELSE subtree_sum - OLD.price END,
+        subtree_min = CASE WHEN subtree_min < OLD.price THEN subtree_min ELSE (
+            SELECT MIN(s.direct_min) FROM category_closure cc JOIN category_stats s ON s.category_id = cc.descendant
+            WHERE cc.ancestor = category_stats.category_id) END,
+        subtree_max = CASE WHEN subtree_max > OLD.price THEN subtree_max ELSE (
+            SELECT MAX(s.direct_max) FROM category_closure cc JOIN category_stats s ON s.category_id = cc.descendant
+            WHERE cc.ancestor = category_stats.category_id) END
+    WHERE category_id IN (SELECT ancestor FROM category_closure WHERE descendant = OLD.category_id);
+"""
+
+_STATS_ADD_PRODUCT = """
+    UPDATE category_stats SET
+        direct_count = direct_count + 1,
+        direct_sum = direct_sum + NEW.price,
+        direct_min = CASE WHEN direct_min <= NEW.price THEN direct_min ELSE NEW.price END,
+        direct_max = CASE WHEN direct_max >= NEW.price THEN direct_max ELSE NEW.price END
+    WHERE category_id = NEW.category_id;
+    UPDATE category_stats SET
+        subtree_count = subtree_count + 1,
+        subtree_sum = subtree_sum + NEW.price,
+        subtree_min = CASE WHEN subtree_min <= NEW.price THEN subtree_min ELSE NEW.price END,
+        subtree_max = CASE WHEN subtree_max >= NEW.price THEN subtree_max ELSE NEW.price END
+    WHERE category_id IN (SELECT ancestor FROM category_closure WHERE descendant = NEW.category_id);
+"""
+
+
+def _add_category_stats(conn):
+    # Product count and price sum/min/max per category, both for products
+    # filed directly under it and for its whole subtree, so rollups are a
+    # primary-key lookup instead of a walk over the tree.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category_id INTEGER PRIMARY KEY,
+            direct_count INTEGER NOT NULL DEFAULT 0,
+            direct_sum REAL NOT NULL DEFAULT 0,
+            direct_min REAL,
+            direct_max REAL,
+            subtree_count INTEGER NOT NULL DEFAULT 0,
+            subtree_sum REAL NOT NULL DEFAULT 0,
+            subtree_min REAL,
+            subtree_max REAL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_stats_insert
+        AFTER INSERT ON categories
+        BEGIN
+            INSERT INTO category_stats (category_id) VALUES (NEW.id);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_stats_delete
+        AFTER DELETE ON categories
+        BEGIN
+            DELETE FROM category_stats WHERE category_id = OLD.id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_insert
+        AFTER INSERT ON products
+        WHEN NEW.category_id IS NOT NULL
+        BEGIN
+            {_STATS_ADD_PRODUCT}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_delete
+        AFTER DELETE ON products
+        WHEN OLD.category_id IS NOT NULL
+        BEGIN
+            {_STATS_REMOVE_PRODUCT}
+        END
+        """
+    )
+    # An update is a removal followed by an insertion. The removal's min/max
+    # re-read may already see the new row; adding it again afterwards is
+    # harmless because min/max are idempotent.
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_update_old
+        AFTER UPDATE OF price, category_id ON products
+        WHEN OLD.category_id IS NOT NULL
+         AND (OLD.price IS NOT NEW.price OR OLD.category_id IS NOT NEW.category_id)
+        BEGIN
+            {_STATS_REMOVE_PRODUCT}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_products_stats_update_new
+        AFTER UPDATE OF price, category_id ON products
+        WHEN NEW.category_id IS NOT NULL
+         AND (OLD.price IS NOT NEW.price OR OLD.category_id IS NOT NEW.category_id)
+        BEGIN
+            {_STATS_ADD_PRODUCT}
+        END
+        """
+    )
+    # Moving a category moves its subtree totals from the old parent's
+    # ancestors to the new parent's. Neither parent is inside the moved
+    # subtree, so their ancestor lists read the same whether or not the
+    # closure trigger has run yet; the min/max re-read excludes the moved
+    # subtree explicitly for the same reason.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_categories_stats_move
+        AFTER UPDATE OF parent_id ON categories
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            UPDATE category_stats SET
+                subtree_count = category_stats.subtree_count - moved.subtree_count,
+                subtree_sum = CASE WHEN category_stats.subtree_count = moved.subtree_count THEN 0
+                                   ELSE category_stats.subtree_sum - moved.subtree_sum END,
+                subtree_min = CASE WHEN moved.subtree_min IS NULL OR category_stats.subtree_min < moved.subtree_min
+                                   THEN category_stats.subtree_min ELSE (
+                    SELECT MIN(s.direct_min) FROM category_closure cc JOIN category_stats s ON s.category_id = cc.descendant
+                    WHERE cc.ancestor = category_stats.category_id
+                      AND cc.descendant NOT IN (SELECT descendant FROM category_closure WHERE ancestor = NEW.id)) END,
+                subtree_max = CASE WHEN moved.subtree_max IS NULL OR category_stats.subtree_max > moved.subtree_max
+                                   THEN category_stats.subtree_max ELSE (
+                    SELECT MAX(s.direct_max) FROM category_closure cc JOIN category_stats s ON s.category_id = cc.descendant
+                    WHERE cc.ancestor = category_stats.category_id
+                      AND cc.descendant NOT IN (SELECT descendant FROM category_closure WHERE ancestor = NEW.id)) END
+            FROM (SELECT * FROM category_stats WHERE category_id = NEW.id) AS moved
+            WHERE category_stats.category_id IN (SELECT ancestor FROM category_closure WHERE descendant = OLD.parent_id);
+
+            UPDATE category_stats SET
+                subtree_count = category_stats.subtree_count + moved.subtree_count,
+                subtree_sum = category_stats.subtree_sum + moved.subtree_sum,
+                subtree_min = CASE WHEN moved.subtree_min IS NULL OR category_stats.subtree_min <= moved.subtree_min
+                                   THEN category_stats.subtree_min ELSE moved.subtree_min END,
+                subtree_max = CASE WHEN moved.subtree_max IS NULL OR category_stats.subtree_max >= moved.subtree_max
+                                   THEN category_stats.subtree_max ELSE moved.subtree_max END
+            FROM (SELECT * FROM category_stats WHERE category_id = NEW.id) AS moved
+            WHERE category_stats.category_id IN (SELECT ancestor FROM category_closure WHERE descendant = NEW.parent_id);
+        END
+        """
+    )
+    rebuild_category_stats(conn)
+
+
+def _change_log_triggers(table, columns):
+    # One journal row per insert, real update and delete, carrying the row as
+    # it is after the change (deletes carry no snapshot).
+    def snapshot(ref):
+        return "json_object(" + ", ".join(f"'{c}', {ref}.{c}" for c in ("id",) + columns) + ")"
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    return (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, op, row_id, data) VALUES ('{table}', 'insert', NEW.id, {snapshot("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_update AFTER UPDATE ON {table}
+        WHEN {changed}
+        BEGIN
+            INSERT INTO change_log (table_name, op, row_id, data) VALUES ('{table}', 'update', NEW.id, {snapshot("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_log_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, op, row_id, data) VALUES ('{table}', 'delete', OLD.id, NULL);
+        END
+        """,
+    )
+
+
+def _add_change_log(conn):
+    # AUTOINCREMENT: seq never goes backwards or gets reused, even after the
+    # newest entries are compacted away.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            data TEXT
+        )
+        """
+    )
+    # Highest seq dropped by compaction; readers behind it have to reload
+    conn.execute("CREATE TABLE IF NOT EXISTS change_log_state (truncated_through INTEGER NOT NULL)")
+    if conn.execute("SELECT 1 FROM change_log_state").fetchone() is None:
+        truncated = 0
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM categories) OR EXISTS (SELECT 1 FROM products)").fetchone()[0]:
+            # Rows written before the journal existed aren't in it, so a reader
+            # starting from 0 must reload; the first logged change gets seq 2.
+            truncated = 1
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', 1)")
+        conn.execute("INSERT INTO change_log_state (truncated_through) VALUES (?)", (truncated,))
+    for table, columns in (("categories", ("name", "parent_id")), ("products", ("name", "price", "category_id"))):
+        for sql in _change_log_triggers(table, columns):
+            conn.execute(sql)
+
+
+MIGRATIONS = (
+    _create_tables,           # 1
+    _add_indexes,             # 2
+    _add_category_closure,    # 3
+    _add_name_search,         # 4
+    _add_category_stats,      # 5
+    _add_change_log,          # 6
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION and return how many steps ran.
+
+    A current schema costs a single PRAGMA read. Each step commits together
+    with its version bump, so an interrupted upgrade resumes where it stopped.
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return 0
+
+    applied = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock in case another process migrated first
+            version = get_schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += 1
+
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
@@ -1,32 +1,235 @@
 # import tkinter as tk
+import time
+_IMPORT_STARTED = time.perf_counter()   # startup is timed from here, before the heavy imports
+
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+import itertools
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import customtkinter as ctk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, Listbox, TclError
 import database.db_manager as db  # Added database import
 
+
+class StartupTimer:
+    """Milestones from the start of this module's import until the app is
+    interactive, reported once on stderr against BUDGET_MS."""
+    BUDGET_MS = 1000
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks.setdefault(name, (time.perf_counter() - self.started) * 1000)
+
+    def report(self):
+        total = max(self.marks.values())
+        verdict = "within" if total <= self.BUDGET_MS else "OVER"
+        steps = ", ".join(f"{name} {ms:.0f}ms" for name, ms in sorted(self.marks.items(), key=lambda m: m[1]))
+        print(f"startup: {steps} ({verdict} the {self.BUDGET_MS}ms budget)", file=sys.stderr)
+
+
+class DbWorker:
+    """Runs database calls off the Tk thread and hands results back to it.
+
+    Jobs run one at a time on a single background thread, so writes keep the
+    order they were submitted in and never contend with each other. Results
+    go through a queue that the Tk thread polls with after(), because Tk
+    widgets must only be touched from the thread running mainloop.
+
+    Every job has a key. Only the newest job per key delivers its result:
+    submitting again replaces a job that hasn't started yet (coalescing
+    repeated refreshes) and drops the result of one already running
+    (cancelling stale loads).
+    """
+    POLL_MS = 30
+
+    def __init__(self, root):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._tokens = itertools.count(1)
+        self._latest = {}       # key -> token of the job whose result is wanted
+        self._futures = {}      # key -> Future of that job
+        self._closed = False
+        self.root.after(self.POLL_MS, self._poll)
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background. on_done(result) or
+        on_error(exception) is then called on the Tk thread, unless a newer
+        job with the same key was submitted or the key was cancelled."""
+        token = next(self._tokens)
+        previous = self._futures.get(key)
+        if previous is not None:
+            previous.cancel()   # no-op if it's already running
+        self._latest[key] = token
+        self._futures[key] = self._executor.submit(self._run, key, token, fn, args, kwargs, on_done, on_error)
+        return token
+
+    def cancel(self, key):
+        """Forget the pending job for key; its result will not be delivered."""
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+        self._latest.pop(key, None)
+
+    def shutdown(self):
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key, token, fn, args, kwargs, on_done, on_error):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._results.put((key, token, on_error, e))
+        else:
+            self._results.put((key, token, on_done, result))
+
+    def _poll(self):
+        if self._closed:
+            return
+        # Reschedule first so a failing callback can't stop the polling loop
+        self.root.after(self.POLL_MS, self._poll)
+        while True:
+            try:
+                key, token, callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self._latest.get(key) != token:
+                continue    # superseded or cancelled
+            del self._latest[key]
+            self._futures.pop(key, None)
+            if callback is not None:
+                callback(value)
+
+
+class SearchBox(ctk.CTkEntry):
+    """Entry that calls on_search(text) once the user pauses typing."""
+    DEBOUNCE_MS = 200
+
+    def __init__(self, parent, on_search, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.on_search = on_search
+        self._pending = None
+        self._last_text = ""
+        self.bind("<KeyRelease>", self._schedule)
+
+    def _schedule(self, event=None):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self._pending = self.after(self.DEBOUNCE_MS, self._fire)
+
+    def _fire(self):
+        self._pending = None
+        text = self.get().strip()
+        if text != self._last_text:
+            self._last_text = text
+            self.on_search(text)
+
+
+class CategoryPicker(ctk.CTkFrame):
+    """Type-ahead category chooser. Typing filters a short list of full
+    category paths from a CategoryIndex; clicking one fills it in. An empty
+    entry means no category."""
+    MAX_MATCHES = 8
+
+    def __init__(self, parent, index, initial_id=None, exclude=(), placeholder="None", **kwargs):
+        super().__init__(parent, fg_color="transparent", **kwargs)
+        self.index = index
+        self.exclude = set(exclude)
+        self._match_ids = []
+
+        self.entry = ctk.CTkEntry(self, width=280, placeholder_text=placeholder)
+        self.entry.pack()
+        if initial_id is not None and index.path(initial_id):
+            self.entry.insert(0, index.path(initial_id))
+        self.matches = Listbox(self, height=self.MAX_MATCHES, width=42, activestyle="none",
+                               bg="#2b2b2b", fg="white", selectbackground="#1f6aa5",
+                               highlightthickness=0, borderwidth=0)
+        self.matches.pack(pady=(2, 0))
+
+        self.entry.bind("<KeyRelease>", self.refresh)
+        self.matches.bind("<<ListboxSelect>>", self.choose)
+        self.refresh()
+
+    def refresh(self, event=None):
+        found = self.index.search(self.entry.get(), self.MAX_MATCHES, self.exclude)
+        self._match_ids = [category_id for category_id, _ in found]
+        self.matches.delete(0, "end")
+        for _, path in found:
+            self.matches.insert("end", path)
+
+    def choose(self, event=None):
+        selection = self.matches.curselection()
+        if not selection:
+            return
+        self.entry.delete(0, "end")
+        self.entry.insert(0, self.index.path(self._match_ids[selection[0]]))
+        self.refresh()
+
+    def get(self):
+        """Return (valid, category id or None). Text that names no category,
+        or an excluded one, is not valid."""
+        text = self.entry.get().strip()
+        if not text:
+            return True, None
+        category_id = self.index.resolve(text)
+        if category_id is None or category_id in self.exclude:
+            return False, None
+        return True, category_id
+
+
 class App(ctk.CTk):
     def __init__(self, title, size):
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
 
+        self.startup = StartupTimer(_IMPORT_STARTED)
+        self.startup.mark("imports")
+
         # main setup
         super().__init__()
         self.title(title)
         self.geometry(f'{size[0]}x{size[1]}')
         self.minsize(size[0], size[1])
 
-        # Initialize database
-        try:
-            db.initialize_database()
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Failed to initialize database: {e}")
+        # All database calls go through this background worker. Opening (and
+        # if needed migrating) the database is its first job, so the window
+        # shows without waiting for it; anything the user asks for meanwhile
+        # queues up behind it.
+        self.worker = DbWorker(self)
+        self.worker.submit("startup", db.initialize_database,
+                           on_done=lambda _: self.startup_step("database ready"),
+                           on_error=self.database_failed)
 
         # widgets
         self.main = Main(self, width=180)
         self.sidebar = SideBar(self, main = self.main, width=180)
+        self.startup.mark("window built")
+        self.after_idle(lambda: self.startup_step("first paint"))
 
         # run
         self.mainloop()
 
+    def startup_step(self, name):
+        """Interactive once the window is drawn and the database is ready."""
+        self.startup.mark(name)
+        marks = self.startup.marks
+        if "first paint" in marks and "database ready" in marks and "interactive" not in marks:
+            self.startup.mark("interactive")
+            self.startup.report()
+
+    def database_failed(self, e):
+        messagebox.showerror("Database Error", f"Failed to initialize database: {e}")
+
+    def destroy(self):
+        self.worker.shutdown()
+        super().destroy()
+
 class SideBar(ctk.CTkFrame):
     def __init__(self, parent, main, **kwargs):
         super().__init__(parent, **kwargs)
@@ -49,28 +252,47 @@ class Main(ctk.CTkFrame):
     def __init__(self, parent, **kwargs):
         super().__init__(parent, **kwargs)
         self.pack(side="right", expand=True, fill='both', padx=10, pady=10)
-
-        self.home_tab = HomeTab(self)
-        self.category_tab = CategoryTab(self)
-        self.product_tab = ProductTab(self)
-        self.category_hierarchy = CategoryHierarchyTab(self)
+        self.worker = parent.worker
+
+        # Tabs are built the first time they are shown and load their data
+        # only then, so startup pays for the home tab alone.
+        self.tab_classes = {
+            "home": HomeTab,
+            "categories": CategoryTab,
+            "products": ProductTab,
+            "hierarchy": CategoryHierarchyTab,
+        }
+        self.tabs = {}
 
         self.show_home_tab()
 
+    def tab(self, name):
+        tab = self.tabs.get(name)
+        if tab is None:
+            tab = self.tabs[name] = self.tab_classes[name](self)
+        return tab
+
+    def switch_to(self, name):
+        tab = self.tab(name)
+        # Loads still running for tabs the user just left are no longer wanted
+        for other in self.tabs.values():
+            if other is not tab and isinstance(other, DataTab):
+                other.cancel_loads()
+        if isinstance(tab, DataTab):
+            tab.refresh()
+        tab.tkraise()
+
     def show_home_tab(self):
-        self.home_tab.tkraise()
+        self.switch_to("home")
 
     def show_category_tab(self):
-        self.category_tab.load_categories()  # ensure refresh
-        self.category_tab.tkraise()
+        self.switch_to("categories")
 
     def show_product_tab(self):
-        self.product_tab.load_products()  # ensure refresh
-        self.product_tab.tkraise()
+        self.switch_to("products")
 
     def show_category_hierarchy(self):
-        self.category_hierarchy.load_hierarchy()  # refresh
-        self.category_hierarchy.tkraise()
+        self.switch_to("hierarchy")
 
 
 class HomeTab(ctk.CTkFrame):
@@ -87,13 +309,125 @@ class HomeTab(ctk.CTkFrame):
         ).pack(pady=10)
 
 
-class CategoryTab(ctk.CTkFrame):
+class DataTab(ctk.CTkFrame, metaclass=ABCMeta):
+    """Base for tabs that talk to the database through the background worker.
+
+    load() is for reads: results of a load are dropped when a newer load
+    with the same key starts or the user leaves the tab. write() is for
+    changes and is never cancelled.
+
+    A tab remembers the data version its view was loaded at. Its own edits
+    go through change(), which patches the affected rows in place; the whole
+    view is reloaded only when the data also changed some other way (another
+    tab, another process), on the next change() or refresh().
+    """
+    _write_ids = itertools.count(1)
+
     def __init__(self, parent):
         super().__init__(parent)
         self.place(relx=0, rely=0, relwidth=1, relheight=1)
+        self.worker = parent.worker
+        self._loads = set()
+        self._writes = set()
+        self.status_label = None
+        self.data_version = None
+
+    def add_status_label(self):
+        self.status_label = ctk.CTkLabel(self, text="", text_color="gray")
+        self.status_label.pack(pady=(0, 5))
+
+    def _update_status(self):
+        if self.status_label is None:
+            return
+        text = "Saving..." if self._writes else "Loading..." if self._loads else ""
+        self.status_label.configure(text=text)
+
+    def _submit(self, jobs, key, fn, args, kwargs, on_done, on_error, error_title):
+        jobs.add(key)
+        self._update_status()
+
+        def done(result):
+            jobs.discard(key)
+            self._update_status()
+            if on_done is not None:
+                on_done(result)
+
+        def failed(e):
+            jobs.discard(key)
+            self._update_status()
+            if on_error is not None:
+                on_error(e)
+            messagebox.showerror("Error", f"{error_title}: {e}")
+
+        self.worker.submit(key, fn, *args, on_done=done, on_error=failed, **kwargs)
+
+    def load(self, key, fn, *args, on_done=None, on_error=None, error_title="Failed to load data", **kwargs):
+        key = (id(self), key)
+        self._submit(self._loads, key, fn, args, kwargs, on_done, on_error, error_title)
+
+    def write(self, fn, *args, on_done=None, on_error=None, error_title="Failed to save", **kwargs):
+        key = ("write", next(self._write_ids))
+        self._submit(self._writes, key, fn, args, kwargs, on_done, on_error, error_title)
+
+    def cancel_loads(self):
+        for key in self._loads:
+            self.worker.cancel(key)
+        self._loads.clear()
+        self._update_status()
+
+    @abstractmethod
+    def reload(self):
+        """Rebuild the whole view from the database."""
+
+    def load_view(self, key, fn, *args, on_done=None, **kwargs):
+        """load() for a full reload: also records the data version it read."""
+        def done(outcome):
+            before, result, _ = outcome
+            self.data_version = before
+            if on_done is not None:
+                on_done(result)
+        self.load(key, _versioned, fn, *args, on_done=done, **kwargs)
+
+    def refresh(self):
+        """Load the view the first time; after that, reload it only if the
+        data changed since it was loaded."""
+        if self.data_version is None:
+            self.reload()
+        else:
+            self.load("version", db.get_data_version, on_done=self._refresh_if_changed)
+
+    def _refresh_if_changed(self, version):
+        if version != self.data_version:
+            self.reload()
+
+    def change(self, fn, *args, apply, on_done=None, **kwargs):
+        """write() for this tab's own edits. When it succeeds, apply(result)
+        patches the view in place, unless the view was already out of date
+        (or the patch doesn't fit it), in which case the view is reloaded.
+        on_done(result) runs afterwards, as with write()."""
+        def done(outcome):
+            before, result, after = outcome
+            if result.get('status') == 'success':
+                if before == self.data_version:
+                    self.data_version = after
+                    try:
+                        apply(result)
+                    except TclError:
+                        self.reload()
+                else:
+                    self.reload()
+            if on_done is not None:
+                on_done(result)
+        self.write(_versioned, fn, *args, on_done=done, **kwargs)
+
+
+class CategoryTab(DataTab):
+    def __init__(self, parent):
+        super().__init__(parent)
 
         # Header/Label
         ctk.CTkLabel(self, text="Category Management", font=("Arial", 20, "bold")).pack(pady=10)
+        self.add_status_label()
 
         tree_frame = ctk.CTkFrame(self)
         tree_frame.pack(expand=True, fill="both", padx=10, pady=10)
@@ -111,20 +445,19 @@ class CategoryTab(ctk.CTkFrame):
         ctk.CTkButton(button_frame, text="Edit Category", command=self.edit_category_popup).pack(side="left", padx=5)
         ctk.CTkButton(button_frame, text="Delete Category", fg_color="red", command=self.delete_category).pack(side="left", padx=(5,0))
 
-        # load initial data
-        self.load_categories()
-
     # ---------- HELPERS ----------
     def load_categories(self):
         """Reload category hierarchy from the database."""
         if not hasattr(self, 'tree'):
             return
+        self.load_view("categories", db.get_category_hierarchy, on_done=self.show_categories,
+                       error_title="Failed to load categories")
+
+    def reload(self):
+        self.load_categories()
+
+    def show_categories(self, hierarchy):
         self.tree.delete(*self.tree.get_children())
-        try:
-            hierarchy = db.get_category_hierarchy()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load categories: {e}")
-            return
 
         def insert_node(parent_iid, node):
             iid = node['id']
@@ -138,44 +471,57 @@ class CategoryTab(ctk.CTkFrame):
         for item in self.tree.get_children():
             self.tree.item(item, open=True)
 
+    def place_category(self, category_id, parent_id):
+        """Put a category's row under its parent, among its siblings in id
+        order like the hierarchy lists them, and bring it into view."""
+        parent = '' if parent_id is None else parent_id
+        siblings = [int(iid) for iid in self.tree.get_children(parent) if iid != str(category_id)]
+        self.tree.move(category_id, parent, bisect_left(siblings, category_id))
+        self.tree.see(category_id)
+        self.tree.selection_set(category_id)
+        self.tree.focus(category_id)
+
     def on_select_category(self, event):
         pass
 
     def add_category_popup(self):
+        self.load("popup", db.get_category_index, on_done=self.open_add_category_popup)
+
+    def open_add_category_popup(self, index):
         popup = ctk.CTkToplevel(self)
         popup.title("Add Category")
-        popup.geometry("320x260")
+        popup.geometry("340x420")
 
         ctk.CTkLabel(popup, text="Category Name:").pack(pady=(15,5))
         name_entry = ctk.CTkEntry(popup)
         name_entry.pack(pady=5)
 
         ctk.CTkLabel(popup, text="Parent Category:").pack(pady=(10,5))
-        categories = db.get_all_categories()
-        parent_options = ["None"] + [c['name'] for c in categories]
-        parent_var = ctk.StringVar(value="None")
-        parent_menu = ctk.CTkOptionMenu(popup, variable=parent_var, values=parent_options)
-        parent_menu.pack(pady=5)
+        parent_picker = CategoryPicker(popup, index)
+        parent_picker.pack(pady=5)
 
-        def save():
-            name = name_entry.get().strip()
-            if not name:
-                messagebox.showwarning("Missing Name", "Please enter a category name.")
-                return
-            parent_id = None
-            selected_parent_name = parent_var.get()
-            if selected_parent_name != "None":
-                for c in categories:
-                    if c['name'] == selected_parent_name:
-                        parent_id = c['id']
-                        break
-            result = db.add_category(name, parent_id)
+        def saved(result):
             if result.get('status') == 'error':
                 messagebox.showerror("Error", result.get('message', 'Failed to add category.'))
             else:
                 messagebox.showinfo("Success", result.get('message', 'Category added.'))
                 popup.destroy()
-                self.load_categories()
+
+        def added(result, name, parent_id):
+            self.tree.insert('', 'end', iid=result['id'], text=name)
+            self.place_category(result['id'], parent_id)
+
+        def save():
+            name = name_entry.get().strip()
+            if not name:
+                messagebox.showwarning("Missing Name", "Please enter a category name.")
+                return
+            valid, parent_id = parent_picker.get()
+            if not valid:
+                messagebox.showwarning("Unknown Parent", "Pick a parent category from the list, or leave it empty.")
+                return
+            self.change(db.add_category, name, parent_id, on_done=saved,
+                        apply=lambda result: added(result, name, parent_id))
         ctk.CTkButton(popup, text="Save", command=save).pack(pady=15)
 
     def edit_category_popup(self):
@@ -184,15 +530,17 @@ class CategoryTab(ctk.CTkFrame):
             messagebox.showwarning("No Selection", "Please select a category to edit.")
             return
         # Fetch current data
-        categories = db.get_all_categories()
-        current = next((c for c in categories if str(c['id']) == str(selected)), None)
+        self.load("popup", _category_edit_data, int(selected),
+                  on_done=lambda data: self.open_edit_category_popup(*data))
+
+    def open_edit_category_popup(self, current, index, subtree_ids):
         if not current:
             messagebox.showerror("Error", "Selected category not found.")
             return
 
         popup = ctk.CTkToplevel(self)
         popup.title("Edit Category")
-        popup.geometry("340x280")
+        popup.geometry("340x420")
 
         ctk.CTkLabel(popup, text="New Name:").pack(pady=(15,5))
         name_entry = ctk.CTkEntry(popup)
@@ -200,37 +548,33 @@ class CategoryTab(ctk.CTkFrame):
         name_entry.pack(pady=5)
 
         ctk.CTkLabel(popup, text="New Parent:").pack(pady=(10,5))
-        # Exclude self from parent choices
-        parent_candidates = [c for c in categories if c['id'] != current['id']]
-        parent_options = ["None"] + [c['name'] for c in parent_candidates]
-        current_parent_name = "None"
-        if current.get('parent_id'):
-            parent_obj = next((c for c in categories if c['id'] == current['parent_id']), None)
-            if parent_obj:
-                current_parent_name = parent_obj['name']
-        parent_var = ctk.StringVar(value=current_parent_name)
-        parent_menu = ctk.CTkOptionMenu(popup, variable=parent_var, values=parent_options)
-        parent_menu.pack(pady=5)
+        # A category can't move under itself or anything below it
+        parent_picker = CategoryPicker(popup, index, initial_id=current['parent_id'], exclude=subtree_ids)
+        parent_picker.pack(pady=5)
 
-        def update():
-            new_name = name_entry.get().strip()
-            if not new_name:
-                messagebox.showwarning("Missing Name", "Please enter a new name.")
-                return
-            new_parent_id = None
-            selected_parent_name = parent_var.get()
-            if selected_parent_name != "None":
-                for c in parent_candidates:
-                    if c['name'] == selected_parent_name:
-                        new_parent_id = c['id']
-                        break
-            result = db.update_category(current['id'], new_name=new_name, new_parent_id=new_parent_id)
+        def updated(result):
             if result.get('status') == 'error':
                 messagebox.showerror("Error", result.get('message', 'Failed to update category.'))
             else:
                 messagebox.showinfo("Success", "Category updated.")
                 popup.destroy()
-                self.load_categories()
+
+        def moved(new_name, new_parent_id):
+            self.tree.item(current['id'], text=new_name)
+            if new_parent_id != current['parent_id']:
+                self.place_category(current['id'], new_parent_id)
+
+        def update():
+            new_name = name_entry.get().strip()
+            if not new_name:
+                messagebox.showwarning("Missing Name", "Please enter a new name.")
+                return
+            valid, new_parent_id = parent_picker.get()
+            if not valid:
+                messagebox.showwarning("Unknown Parent", "Pick a parent category from the list, or leave it empty.")
+                return
+            self.change(db.edit_category, current['id'], new_name, new_parent_id,
+                        on_done=updated, apply=lambda result: moved(new_name, new_parent_id))
         ctk.CTkButton(popup, text="Update", command=update).pack(pady=15)
 
     def delete_category(self):
@@ -240,34 +584,69 @@ class CategoryTab(ctk.CTkFrame):
             return
         if not messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this category? This cannot be undone."):
             return
-        try:
-            result = db.delete_category(int(selected))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed: {e}")
-            return
-        if result.get('status') == 'error':
-            messagebox.showerror("Error", result.get('message', 'Delete failed.'))
-        else:
-            messagebox.showinfo("Success", "Category deleted.")
-            self.load_categories()
 
+        def deleted(result):
+            if result.get('message') in ("Category has existing products.", "Category has subcategories."):
+                if messagebox.askyesno(
+                        "Delete Subtree",
+                        f"{result['message']}\n\nDelete it together with all of its subcategories and their products?"):
+                    self.change(db.delete_subtree, int(selected), on_done=deleted, apply=remove, error_title="Failed")
+            elif result.get('status') == 'error':
+                messagebox.showerror("Error", result.get('message', 'Delete failed.'))
+            else:
+                messagebox.showinfo("Success", "Category deleted.")
+
+        def remove(result):
+            # Deleting the row drops the rows of its subcategories with it
+            self.tree.delete(selected)
+
+        self.change(db.delete_category, int(selected), on_done=deleted, apply=remove, error_title="Failed")
+
+
+class ProductTab(DataTab):
+    PAGE_SIZE = 200          # rows fetched per page: roughly a screenful plus buffer
+    PREFETCH_AT = 0.9        # fetch the next page once the view reaches 90% of loaded rows
+    MAX_ROWS = 3 * PAGE_SIZE # rows kept in the table; pages beyond this are dropped and re-fetched
+    COLUMN_SORT_KEYS = {"name": "name", "price": "price", "category": "category"}
+    FILTER_LIMIT = 1000      # filtered listings aren't paged; show at most this many rows
 
-class ProductTab(ctk.CTkFrame):
     def __init__(self, parent):
         super().__init__(parent)
-        self.place(relx=0, rely=0, relwidth=1, relheight=1)
+
+        self.sort_by = "id"
+        self.sort_desc = False
+        self.next_key = None
+        self.has_before = False # rows before the first one shown were dropped to keep MAX_ROWS
+        self.loading = False
+        self.search_text = ""
+        self.filters = {}
+        self.sort_keys = {}     # iid -> sort key of every loaded row, in table order
 
         # Header/Label
         ctk.CTkLabel(self, text="Product Management", font=("Arial", 20, "bold")).pack(pady=(10,5))
 
+        self.search_box = SearchBox(self, on_search=self.search_products, placeholder_text="Search products...", width=300)
+        self.search_box.pack(pady=(0, 5))
+
+        filter_frame = ctk.CTkFrame(self, fg_color="transparent")
+        filter_frame.pack(pady=(0, 5))
+        ctk.CTkButton(filter_frame, text="Filter...", width=90, command=self.filter_popup).pack(side="left", padx=5)
+        ctk.CTkButton(filter_frame, text="Clear Filter", width=90, command=self.clear_filter).pack(side="left", padx=5)
+        self.facet_label = ctk.CTkLabel(self, text="", wraplength=700, justify="left")
+        self.facet_label.pack(pady=(0, 5))
+        self.add_status_label()
+
         table_frame = ctk.CTkFrame(self)
         table_frame.pack(expand=True, fill="both", padx=10, pady=10)
         self.product_table = ttk.Treeview(
             table_frame, columns=("name", "price", "category"), show="headings")
-        self.product_table.heading("name", text="Product Name")
-        self.product_table.heading("price", text="Price (₱)")
-        self.product_table.heading("category", text="Category")
-        self.product_table.pack(expand=True, fill="both", padx=10, pady=10)
+        self.product_table.heading("name", text="Product Name", command=lambda: self.sort_products("name"))
+        self.product_table.heading("price", text="Price (₱)", command=lambda: self.sort_products("price"))
+        self.product_table.heading("category", text="Category", command=lambda: self.sort_products("category"))
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.product_table.yview)
+        self.product_table.configure(yscrollcommand=lambda first, last: self.on_table_scroll(scrollbar, first, last))
+        scrollbar.pack(side="right", fill="y", pady=10)
+        self.product_table.pack(expand=True, fill="both", padx=(10, 0), pady=10)
 
         # Buttons
         button_frame = ctk.CTkFrame(self)
@@ -277,27 +656,250 @@ class ProductTab(ctk.CTkFrame):
         ctk.CTkButton(button_frame, text="Edit Product", command=self.edit_product_popup).pack(side="left", padx=5)
         ctk.CTkButton(button_frame, text="Delete Product", fg_color="red", command=self.delete_product).pack(side="left", padx=(5,0))
 
-        # Load Products from Database
-        self.load_products()
-
     # ---------- HELPERS ----------
     def load_products(self):
-        """Reload product data from the database."""
+        """Reload product data from the database, starting again at the first page.
+        Replaces any page fetch still in flight."""
         if not hasattr(self, 'product_table'):
             return
-        self.product_table.delete(*self.product_table.get_children())
-        try:
-            products = db.get_all_products()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load products: {e}")
+        self.loading = True
+        if self.filters:
+            self.load_view("products", db.query_products, name=self.search_text, order_by=self.sort_by,
+                           descending=self.sort_desc, limit=self.FILTER_LIMIT, facets=True, **self.filters,
+                           on_done=self.show_filtered,
+                           on_error=self.load_failed, error_title="Filter failed")
+        elif self.search_text:
+            self.load_view("products", db.search_products, self.search_text, limit=self.PAGE_SIZE,
+                           on_done=lambda products: self.show_products(products, None, replace=True),
+                           on_error=self.load_failed, error_title="Search failed")
+        else:
+            self.load_view("products", db.get_products_page, None, self.PAGE_SIZE, self.sort_by, self.sort_desc,
+                           on_done=lambda page: self.show_products(page['products'], page['next_key'], replace=True),
+                           on_error=self.load_failed, error_title="Failed to load products")
+
+    def reload(self):
+        self.load_products()
+
+    def load_next_page(self):
+        """Append the next page of products to the table."""
+        if self.loading or self.next_key is None:
+            return
+        self.loading = True
+        self.load("products", db.get_products_page, self.next_key, self.PAGE_SIZE, self.sort_by, self.sort_desc,
+                  on_done=lambda page: self.show_products(page['products'], page['next_key']),
+                  on_error=self.load_failed, error_title="Failed to load products")
+
+    def load_previous_page(self):
+        """Fetch back the page before the first row shown, by reading the
+        listing in the opposite direction from it."""
+        children = self.product_table.get_children()
+        if self.loading or not self.has_before or not children:
             return
+        self.loading = True
+        self.load("products", db.get_products_page, self.sort_keys[children[0]], self.PAGE_SIZE, self.sort_by,
+                  not self.sort_desc, on_done=self.show_previous_page,
+                  on_error=self.load_failed, error_title="Failed to load products")
+
+    def load_failed(self, error):
+        self.loading = False
+
+    def cancel_loads(self):
+        super().cancel_loads()
+        self.loading = False
+
+    def show_products(self, products, next_key, replace=False):
+        self.loading = False
+        self.next_key = next_key
+        if replace:
+            self.product_table.delete(*self.product_table.get_children())
+            self.product_table.yview_moveto(0)
+            self.sort_keys.clear()
+            self.has_before = False
         for p in products:
-            self.product_table.insert('', 'end', iid=p['id'], values=(p['name'], p['price'], p['category_name'] or 'Uncategorized'))
+            if self.product_table.exists(p['id']):
+                continue    # placed in view by an edit before its page arrived
+            self.product_table.insert('', 'end', iid=p['id'], values=self.row_values(p))
+            self.sort_keys[str(p['id'])] = self.sort_key(p)
+        self.drop_rows(from_top=True)
+
+    def show_previous_page(self, page):
+        self.loading = False
+        self.has_before = page['next_key'] is not None
+        top = self.first_visible_index()
+        added = 0
+        # The page runs backwards from the first row shown, nearest row first
+        for p in page['products']:
+            if self.product_table.exists(p['id']):
+                continue
+            self.product_table.insert('', 0, iid=p['id'], values=self.row_values(p))
+            self.sort_keys[str(p['id'])] = self.sort_key(p)
+            added += 1
+        self.scroll_to_index(top + added)
+        self.drop_rows(from_top=False)
+
+    def first_visible_index(self):
+        return round(self.product_table.yview()[0] * len(self.product_table.get_children()))
+
+    def scroll_to_index(self, index):
+        count = len(self.product_table.get_children())
+        self.product_table.yview_moveto(index / count if count else 0)
+
+    def drop_rows(self, from_top):
+        """Keep at most MAX_ROWS rows in the table by dropping whole pages from
+        the end away from where the user is scrolling. The view stays put;
+        dropped rows are fetched again by keyset if the user scrolls back."""
+        if self.search_text or self.filters:
+            return      # not paged: those results are fetched whole
+        children = self.product_table.get_children()
+        excess = len(children) - self.MAX_ROWS
+        if excess <= 0:
+            return
+        count = -(-excess // self.PAGE_SIZE) * self.PAGE_SIZE
+        top = self.first_visible_index()
+        dropped = children[:count] if from_top else children[-count:]
+        self.product_table.delete(*dropped)
+        for iid in dropped:
+            self.sort_keys.pop(iid, None)
+        if from_top:
+            self.has_before = True
+            self.scroll_to_index(top - count)
+        else:
+            self.next_key = self.sort_keys[children[-count - 1]]
+
+    @staticmethod
+    def row_values(p):
+        return (p['name'], p['price'], p['category_name'] or 'Uncategorized')
+
+    def sort_key(self, p):
+        """The key get_products_page orders p by under the current sort."""
+        if self.sort_by == "id":
+            return (p['id'],)
+        value = {"name": p['name'], "price": p['price'], "category": p['category_name'] or ''}[self.sort_by]
+        return (value, p['id'])
+
+    def place_product(self, p):
+        """Show a new or edited product where the current listing would have
+        it. A row that sorts after everything loaded so far is left for its
+        page to bring in. Search and filter results are re-run instead."""
+        if self.search_text or self.filters:
+            self.load_products()
+            return
+        self.remove_product(p['id'])
+        key = self.sort_key(p)
+        children = self.product_table.get_children()
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self.sort_keys[children[mid]]
+            if (other > key) if self.sort_desc else (other < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        if (lo == len(children) and self.next_key is not None) or (lo == 0 and self.has_before):
+            return
+        self.product_table.insert('', lo, iid=p['id'], values=self.row_values(p))
+        self.sort_keys[str(p['id'])] = key
+        self.product_table.see(p['id'])
+        self.product_table.selection_set(p['id'])
+        self.product_table.focus(p['id'])
+
+    def remove_product(self, product_id):
+        if self.product_table.exists(product_id):
+            self.product_table.delete(product_id)
+        self.sort_keys.pop(str(product_id), None)
+
+    def show_filtered(self, result):
+        self.show_products(result['products'], None, replace=True)
+        self.facet_label.configure(text=self.describe_facets(result['facets'], len(result['products'])))
+
+    @staticmethod
+    def describe_facets(facets, shown):
+        total = facets['total']
+        lines = [f"{total} matching products" + (f" (showing {shown})" if shown < total else "")]
+        buckets = [
+            f"₱{b['min']}+: {b['count']}" if b['max'] is None else f"₱{b['min']}–{b['max']}: {b['count']}"
+            for b in facets['price'] if b['count']
+        ]
+        if buckets:
+            lines.append("Price  " + "  ·  ".join(buckets))
+        if facets['categories']:
+            lines.append("Category  " + "  ·  ".join(f"{c['name']}: {c['count']}" for c in facets['categories']))
+        return "\n".join(lines)
+
+    def on_table_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # Defer so the fetch doesn't start inside Tk's scroll callback
+        if float(last) >= self.PREFETCH_AT and self.next_key is not None:
+            self.after_idle(self.load_next_page)
+        elif float(first) <= 1 - self.PREFETCH_AT and self.has_before:
+            self.after_idle(self.load_previous_page)
+
+    def sort_products(self, column):
+        """Sort by a column header; clicking the same header again reverses the order."""
+        sort_by = self.COLUMN_SORT_KEYS[column]
+        self.sort_desc = not self.sort_desc if self.sort_by == sort_by else False
+        self.sort_by = sort_by
+        self.load_products()
+
+    def search_products(self, text):
+        """Show the best matches for text, or the normal listing when it's empty."""
+        self.search_text = text
+        self.load_products()
+
+    def clear_filter(self):
+        if self.filters:
+            self.filters = {}
+            self.facet_label.configure(text="")
+            self.load_products()
+
+    def filter_popup(self):
+        self.load("popup", db.get_category_index, on_done=self.open_filter_popup)
+
+    def open_filter_popup(self, index):
+        popup = ctk.CTkToplevel(self)
+        popup.title("Filter Products")
+        popup.geometry("340x560")
+
+        ctk.CTkLabel(popup, text="In Category:").pack(pady=(15,5))
+        cat_picker = CategoryPicker(popup, index, initial_id=self.filters.get('category_subtree'), placeholder="Any")
+        cat_picker.pack(pady=5)
+
+        entries = {}
+        for key, label in (('min_price', "Min Price:"), ('max_price', "Max Price:"),
+                           ('per_category', "First N per Category (by current sort):")):
+            ctk.CTkLabel(popup, text=label).pack(pady=(10,5))
+            entries[key] = ctk.CTkEntry(popup, placeholder_text="Any")
+            if self.filters.get(key) is not None:
+                entries[key].insert(0, self.filters[key])
+            entries[key].pack(pady=5)
+
+        def apply():
+            valid, category_id = cat_picker.get()
+            if not valid:
+                messagebox.showwarning("Unknown Category", "Pick a category from the list, or leave it empty.")
+                return
+            filters = {'category_subtree': category_id}
+            try:
+                for key, convert in (('min_price', float), ('max_price', float), ('per_category', int)):
+                    raw = entries[key].get().strip()
+                    filters[key] = convert(raw) if raw else None
+            except ValueError:
+                messagebox.showerror("Invalid Filter", "Prices must be numbers and N a whole number.")
+                return
+            self.filters = {key: value for key, value in filters.items() if value is not None}
+            popup.destroy()
+            if not self.filters:
+                self.facet_label.configure(text="")
+            self.load_products()
+        ctk.CTkButton(popup, text="Apply", command=apply).pack(pady=15)
 
     def add_product_popup(self):
+        self.load("popup", db.get_category_index, on_done=self.open_add_product_popup)
+
+    def open_add_product_popup(self, index):
         popup = ctk.CTkToplevel(self)
         popup.title("Add Product")
-        popup.geometry("320x340")
+        popup.geometry("340x480")
 
         ctk.CTkLabel(popup, text="Product Name:").pack(pady=(15,5))
         name_entry = ctk.CTkEntry(popup)
@@ -308,11 +910,15 @@ class ProductTab(ctk.CTkFrame):
         price_entry.pack(pady=5)
 
         ctk.CTkLabel(popup, text="Category:").pack(pady=(10,5))
-        categories = db.get_all_categories()
-        cat_options = ["Uncategorized"] + [c['name'] for c in categories]
-        cat_var = ctk.StringVar(value=cat_options[0])
-        cat_menu = ctk.CTkOptionMenu(popup, variable=cat_var, values=cat_options)
-        cat_menu.pack(pady=5)
+        cat_picker = CategoryPicker(popup, index, placeholder="Uncategorized")
+        cat_picker.pack(pady=5)
+
+        def saved(result):
+            if result.get('status') == 'error':
+                messagebox.showerror("Error", result.get('message', 'Failed to add product.'))
+            else:
+                messagebox.showinfo("Success", "Product added.")
+                popup.destroy()
 
         def save():
             name = name_entry.get().strip()
@@ -325,20 +931,12 @@ class ProductTab(ctk.CTkFrame):
             except ValueError:
                 messagebox.showerror("Invalid Price", "Enter a valid number for price.")
                 return
-            category_id = None
-            selected_cat = cat_var.get()
-            if selected_cat != "Uncategorized":
-                for c in categories:
-                    if c['name'] == selected_cat:
-                        category_id = c['id']
-                        break
-            result = db.add_product(name, price, category_id)
-            if result.get('status') == 'error':
-                messagebox.showerror("Error", result.get('message', 'Failed to add product.'))
-            else:
-                messagebox.showinfo("Success", "Product added.")
-                popup.destroy()
-                self.load_products()
+            valid, category_id = cat_picker.get()
+            if not valid:
+                messagebox.showwarning("Unknown Category", "Pick a category from the list, or leave it empty.")
+                return
+            self.change(_add_product, name, price, category_id, on_done=saved,
+                        apply=lambda result: self.place_product(result['product']))
         ctk.CTkButton(popup, text="Save", command=save).pack(pady=15)
 
     def edit_product_popup(self):
@@ -347,9 +945,12 @@ class ProductTab(ctk.CTkFrame):
             messagebox.showwarning("No Selection", "Please select a product to edit.")
             return
         data = self.product_table.item(selected, 'values')
+        self.load("popup", db.get_category_index, on_done=lambda index: self.open_edit_product_popup(selected, data, index))
+
+    def open_edit_product_popup(self, selected, data, index):
         popup = ctk.CTkToplevel(self)
         popup.title("Edit Product")
-        popup.geometry("320x360")
+        popup.geometry("340x480")
 
         ctk.CTkLabel(popup, text="Product Name:").pack(pady=(15,5))
         name_entry = ctk.CTkEntry(popup)
@@ -362,12 +963,16 @@ class ProductTab(ctk.CTkFrame):
         price_entry.pack(pady=5)
 
         ctk.CTkLabel(popup, text="Category:").pack(pady=(10,5))
-        categories = db.get_all_categories()
-        cat_options = ["Uncategorized"] + [c['name'] for c in categories]
-        current_cat_name = data[2] if data[2] else "Uncategorized"
-        cat_var = ctk.StringVar(value=current_cat_name)
-        cat_menu = ctk.CTkOptionMenu(popup, variable=cat_var, values=cat_options)
-        cat_menu.pack(pady=5)
+        # Category names are unique, so the name shown in the table resolves to its id
+        cat_picker = CategoryPicker(popup, index, initial_id=index.resolve(data[2]), placeholder="Uncategorized")
+        cat_picker.pack(pady=5)
+
+        def updated(result):
+            if result.get('status') == 'error':
+                messagebox.showerror("Error", result.get('message', 'Failed to update product.'))
+            else:
+                messagebox.showinfo("Success", "Product updated.")
+                popup.destroy()
 
         def update():
             name = name_entry.get().strip()
@@ -380,20 +985,12 @@ class ProductTab(ctk.CTkFrame):
             except ValueError:
                 messagebox.showerror("Invalid Price", "Enter a valid number for price.")
                 return
-            category_id = None
-            selected_cat = cat_var.get()
-            if selected_cat != "Uncategorized":
-                for c in categories:
-                    if c['name'] == selected_cat:
-                        category_id = c['id']
-                        break
-            result = db.update_product(int(selected), name, price, category_id)
-            if result.get('status') == 'error':
-                messagebox.showerror("Error", result.get('message', 'Failed to update product.'))
-            else:
-                messagebox.showinfo("Success", "Product updated.")
-                popup.destroy()
-                self.load_products()
+            valid, category_id = cat_picker.get()
+            if not valid:
+                messagebox.showwarning("Unknown Category", "Pick a category from the list, or leave it empty.")
+                return
+            self.change(_update_product, int(selected), name, price, category_id, on_done=updated,
+                        apply=lambda result: self.place_product(result['product']))
         ctk.CTkButton(popup, text="Update", command=update).pack(pady=15)
 
     def delete_product(self):
@@ -403,58 +1000,169 @@ class ProductTab(ctk.CTkFrame):
             return
         if not messagebox.askyesno("Confirm Delete", "Delete selected product? This cannot be undone."):
             return
-        result = db.delete_product(int(selected))
-        if result.get('status') == 'error':
-            messagebox.showerror("Error", result.get('message', 'Delete failed.'))
-        else:
-            messagebox.showinfo("Success", "Product deleted.")
-            self.load_products()
 
+        def deleted(result):
+            if result.get('status') == 'error':
+                messagebox.showerror("Error", result.get('message', 'Delete failed.'))
+            else:
+                messagebox.showinfo("Success", "Product deleted.")
+
+        self.change(db.delete_product, int(selected), on_done=deleted,
+                    apply=lambda result: self.remove_product(selected))
+
+
+def _versioned(fn, *args, **kwargs):
+    """Run fn and return (data version before, its result, data version after)."""
+    before = db.get_data_version()
+    result = fn(*args, **kwargs)
+    return before, result, db.get_data_version()
+
+
+def _add_product(name, price, category_id):
+    """add_product, plus the new row as listings show it (under "product")."""
+    result = db.add_product(name, price, category_id)
+    if result.get('status') == 'success':
+        result['product'] = db.get_product(result['product_id'])
+    return result
+
+
+def _update_product(product_id, name, price, category_id):
+    result = db.update_product(product_id, name, price, category_id)
+    if result.get('status') == 'success':
+        result['product'] = db.get_product(product_id)
+    return result
+
+
+def _category_edit_data(category_id):
+    return db.get_category_map().get(category_id), db.get_category_index(), db.get_subtree_ids(category_id)
+
+
+def _search_catalog(text):
+    return db.search_categories(text), db.search_products(text)
 
-class CategoryHierarchyTab(ctk.CTkFrame):
+
+def _load_category_node(category_id):
+    return db.get_products_by_category(category_id), db.get_child_categories(category_id)
+
+
+class CategoryHierarchyTab(DataTab):
     def __init__(self, parent):
         super().__init__(parent)
-        self.place(relx=0, rely=0, relwidth=1, relheight=1)
 
         ctk.CTkLabel(self, text="Category Hierarchy", font=("Arial", 20, "bold")).pack(pady=10)
 
+        self.search_text = ""
+        self.search_box = SearchBox(self, on_search=self.search, placeholder_text="Search categories and products...", width=300)
+        self.search_box.pack(pady=(0, 5))
+        self.add_status_label()
+
         tree_frame = ctk.CTkFrame(self)
         tree_frame.pack(expand=True, fill="both", padx=10, pady=10)
 
-        # Treeview with only Name and Price
-        self.tree = ttk.Treeview(tree_frame, columns=("price",), show="tree headings")
+        # Products show their price; categories show rollups over their whole subtree
+        self.tree = ttk.Treeview(tree_frame, columns=("price", "count", "min", "avg", "max"), show="tree headings")
         self.tree.heading("#0", text="Category & Product Name")
         self.tree.heading("price", text="Price (₱)")
+        self.tree.heading("count", text="Products")
+        self.tree.heading("min", text="Min (₱)")
+        self.tree.heading("avg", text="Avg (₱)")
+        self.tree.heading("max", text="Max (₱)")
+        for column in ("price", "count", "min", "avg", "max"):
+            self.tree.column(column, width=80, anchor="e")
         self.tree.pack(expand=True, fill="both", padx=10, pady=10)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
 
+    def search(self, text):
+        """Show matching categories (with their full path) and products, or
+        the full tree again when the search box is cleared."""
+        self.search_text = text
         self.load_hierarchy()
 
-    def load_hierarchy(self):
+    def show_search_results(self, results):
+        categories, products = results
         self.tree.delete(*self.tree.get_children())
+        for c in categories:
+            self.tree.insert("", "end", iid=f"cat_{c['id']}", text=c['path'], values=("",))
+        for p in products:
+            self.tree.insert("", "end", iid=f"prod_{p['id']}", text=p['name'], values=(f"{p['price']:.2f}",))
 
-        categories = db.get_category_hierarchy()
-        products = db.get_all_products()
-
-        def insert_category(parent_iid, category_node):
-            cat_iid = f"cat_{category_node['id']}"
-            self.tree.insert(parent_iid, "end", iid=cat_iid, text=category_node['name'], values=("",))
-
-            # Insert products under this category
-            for p in products:
-                if p['category_id'] == category_node['id']:
-                    prod_iid = f"prod_{p['id']}"
-                    self.tree.insert(cat_iid, "end", iid=prod_iid, text=p['name'], values=(f"{p['price']:.2f}",))
-
-            # Insert subcategories recursively
-            for child in category_node.get("children", []):
-                insert_category(cat_iid, child)
-
-        for root in categories:
-            insert_category("", root)
-
-        # Expand all
-        for item in self.tree.get_children():
-            self.tree.item(item, open=True)
+    def load_hierarchy(self):
+        """Show the root categories; deeper levels load when a node is opened.
+        Nodes that were expanded before the refresh are expanded again."""
+        self.cancel_loads()   # drop node loads meant for the tree being replaced
+        if self.search_text:
+            self.load_view("hierarchy", _search_catalog, self.search_text, on_done=self.show_search_results,
+                           error_title="Search failed")
+            return
+        expanded = self.expanded_categories()
+        self.load_view("hierarchy", db.get_child_categories, None,
+                       on_done=lambda roots: self.show_roots(roots, expanded),
+                       error_title="Failed to load hierarchy")
 
+    def reload(self):
+        self.load_hierarchy()
 
-App('Class based app with ctk', (900, 600))
\ No newline at end of file
+    def show_roots(self, roots, expanded):
+        self.tree.delete(*self.tree.get_children())
+        self.insert_categories("", roots)
+        self.restore_expanded("", expanded)
+
+    def insert_categories(self, parent_iid, categories):
+        for c in categories:
+            cat_iid = f"cat_{c['id']}"
+            self.tree.insert(parent_iid, "end", iid=cat_iid, text=c['name'], values=self.stats_values(c))
+            if c['has_children'] or c['has_products']:
+                # Placeholder so Tk draws the expand arrow; replaced on first open
+                self.tree.insert(cat_iid, "end", iid=f"stub_{c['id']}", text="Loading...")
+
+    @staticmethod
+    def stats_values(c):
+        """Row values for a category from the subtree rollups in c."""
+        if not c['subtree_count']:
+            return ("", 0, "", "", "")
+        return ("", c['subtree_count'], f"{c['subtree_min']:.2f}", f"{c['subtree_avg']:.2f}", f"{c['subtree_max']:.2f}")
+
+    def on_open(self, event):
+        self.load_children(self.tree.focus())
+
+    def load_children(self, cat_iid, expanded=None):
+        """Replace a category's placeholder with its products and subcategories."""
+        if not cat_iid.startswith("cat_"):
+            return
+        category_id = int(cat_iid[len("cat_"):])
+        if not self.tree.exists(f"stub_{category_id}"):
+            return  # already loaded
+        self.load(cat_iid, _load_category_node, category_id,
+                  on_done=lambda node: self.show_children(cat_iid, node, expanded),
+                  error_title="Failed to load category")
+
+    def show_children(self, cat_iid, node, expanded):
+        category_id = int(cat_iid[len("cat_"):])
+        stub = f"stub_{category_id}"
+        if not self.tree.exists(stub):
+            return  # tree was rebuilt or this node already filled in
+        self.tree.delete(stub)
+        products, children = node
+        for p in products:
+            self.tree.insert(cat_iid, "end", iid=f"prod_{p['id']}", text=p['name'], values=(f"{p['price']:.2f}",))
+        self.insert_categories(cat_iid, children)
+        if expanded:
+            self.restore_expanded(cat_iid, expanded)
+
+    def expanded_categories(self, parent_iid=""):
+        """Return the iids of every loaded category node that is open."""
+        expanded = set()
+        for iid in self.tree.get_children(parent_iid):
+            if iid.startswith("cat_") and self.tree.item(iid, "open"):
+                expanded.add(iid)
+                expanded |= self.expanded_categories(iid)
+        return expanded
+
+    def restore_expanded(self, parent_iid, expanded):
+        for iid in self.tree.get_children(parent_iid):
+            if iid in expanded:
+                self.tree.item(iid, open=True)
+                self.load_children(iid, expanded)
+
+
+App('Class based app with ctk', (900, 600))
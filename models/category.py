@@ -1,8 +1,19 @@
 class Category:
+    # Slots instead of a per-instance __dict__: listings build one per row
+    __slots__ = ("id", "name", "parent_id")
+
     def __init__(self, id=None, name=None, parent_id=None):
         self.id = id
         self.name = name
         self.parent_id = parent_id
 
+    @classmethod
+    def from_row(cls, cursor, row):
+        """sqlite3 row_factory for SELECT id, name, parent_id."""
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Category(id={self.id!r}, name={self.name!r}, parent_id={self.parent_id!r})"
+
     def to_dict(self):
-        return {"id": self.id, "name": self.name, "parent_id": self.parent_id}
\ No newline at end of file
+        return {"id": self.id, "name": self.name, "parent_id": self.parent_id}
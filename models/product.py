@@ -1,9 +1,23 @@
 class Product:
-    def __init__(self, id=None, name=None, price=None, category_id=None):
+    # Slots instead of a per-instance __dict__: listings build one per row
+    __slots__ = ("id", "name", "price", "category_id", "category_name", "category_path")
+
+    def __init__(self, id=None, name=None, price=None, category_id=None, category_name=None, category_path=None):
         self.id = id
         self.name = name
         self.price = price
         self.category_id = category_id
+        self.category_name = category_name
+        self.category_path = category_path
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        """sqlite3 row_factory for SELECT id, name, price, category_id
+        [, category name [, category path]]."""
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Product(id={self.id!r}, name={self.name!r}, price={self.price!r}, category_id={self.category_id!r})"
 
     def to_dict(self):
         return {
@@ -11,4 +25,4 @@ class Product:
             "name": self.name,
             "price": self.price,
             "category_id": self.category_id,
-        }
\ No newline at end of file
+        }